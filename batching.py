@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+
+# Longest message sent in one transfer; a full 100-point SOUR:LIST:VOLT
+# (~915 bytes) still fits with its TRIG:COUN/INIT.
+INPUT_BUFFER_BYTES = 1024
+
+
+def join_commands(commands):
+    """Join SCPI commands into one message.
+
+    Every command after the first is rooted with ':' so it doesn't inherit
+    the previous command's header path; common commands (*XXX) stand alone.
+    """
+    parts = []
+    for command in commands:
+        if parts and not command.startswith(("*", ":")):
+            command = ":" + command
+        parts.append(command)
+    return ";".join(parts)
+
+
+class CommandBatch:
+    """Collect writes and send them as ';'-joined transfers.
+
+    A transfer is flushed before it would exceed `max_bytes`, and when the
+    batch closes. Queries flush first so replies stay in order. With
+    `verify`, closing a batch that sent anything waits on *OPC? once,
+    instead of after every command.
+    """
+
+    def __init__(self, instrument, max_bytes=INPUT_BUFFER_BYTES, verify=False):
+        self.instrument = instrument
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.transfers = 0
+        self._pending = []
+        self._size = 0
+        self._queued = {}   # header -> value written in this batch, for ensure()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pending.clear()   # don't send half a setup after a failure
+
+    def write(self, command):
+        size = len(command) + 2   # ';:' separator
+        if self._pending and self._size + size > self.max_bytes:
+            self.flush()
+        self._pending.append(command)
+        self._size += size
+
+    def ensure(self, header, value):
+        """Queue `header value` unless the instrument's shadow or this batch already has it."""
+        value = str(value)
+        key = header.upper()
+        if key in self._queued:
+            if self._queued[key] == value.upper():
+                return False
+        else:
+            cached = getattr(self.instrument, "cached", None)
+            if cached is not None and cached(header) == value.upper():
+                return False
+        self._queued[key] = value.upper()
+        self.write(f"{header} {value}")
+        return True
+
+    def query(self, command):
+        self.flush()
+        return self.instrument.query(command)
+
+    def flush(self):
+        if not self._pending:
+            return
+        message = join_commands(self._pending)
+        self._pending.clear()
+        self._size = 0
+        self.instrument.write(message)
+        self.transfers += 1
+
+    def close(self):
+        self.flush()
+        if self.verify and self.transfers:
+            self.instrument.query("*OPC?")
+
+
+class PipelinedWriter:
+    """Call `write` from a helper thread, one write in flight and one queued.
+
+    The caller formats the next command while the previous one is still
+    going out on the bus. `send` blocks only when both slots are taken, so
+    a slow bus pushes back instead of building latency. An I/O error in
+    the writer thread is raised from the next `send` or from `close`.
+    `sent_at` holds the perf_counter time each write actually started,
+    taken in the writer thread (a send only queues the command).
+    """
+
+    def __init__(self, write):
+        self.write = write
+        self.sent_at = []
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(raise_errors=exc_type is None)
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is None:
+                return
+            if self._error is None:
+                try:
+                    self.sent_at.append(time.perf_counter())
+                    self.write(command)
+                except Exception as e:
+                    self._error = e
+
+    def _raise_pending(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def send(self, command):
+        self._raise_pending()
+        self._queue.put(command)
+
+    def close(self, raise_errors=True):
+        """Wait until every queued write has gone out."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if raise_errors:
+            self._raise_pending()
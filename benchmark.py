@@ -0,0 +1,190 @@
+"""Headless benchmarks for waveform synthesis, preview rendering and transmission.
+
+Runs against simulated SourceMeters on the offscreen Qt platform and
+writes the results to a JSON file, so runs of different versions can be
+compared:
+
+    python benchmark.py -o results-v2.json
+    python benchmark.py --quick
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+
+from connections import ConnectionManager
+from execution import RunControl, achievable_rate, configure_voltage_source, plan_samples, run_waveform
+from shadow import ShadowedInstrument
+from simulator import SimulatedSourceMeter
+from waveform import WaveformParams, adaptive_samples, execution_samples
+
+
+SYNTHESIS_SAMPLES = (1_000, 10_000, 100_000, 1_000_000)
+PREVIEW_REPEATS = (1, 10, 100, 1_000, 10_000)
+MAX_ERROR = 0.002     # V, the panels' default
+
+# name, simulated resource, list mode, native sweeps, pipelined writes
+EXECUTION_MODES = (
+    ("stream-serial", "ASRL4::INSTR", False, False, False),
+    ("stream-serial-pipelined", "ASRL4::INSTR", False, False, True),
+    ("stream-gpib", "GPIB0::24::INSTR", False, False, False),
+    ("list-serial", "ASRL4::INSTR", True, False, False),
+    ("list-sweeps-serial", "ASRL4::INSTR", True, True, False),
+    ("list-gpib", "GPIB0::24::INSTR", True, False, False),
+)
+
+
+def best_of(fn, repeat):
+    """(min, median) seconds of `repeat` calls of fn()."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), float(np.median(times))
+
+
+def bench_synthesis(quick):
+    """Samples/s of one-cycle synthesis for each periodic waveform."""
+    results = []
+    sizes = SYNTHESIS_SAMPLES[:-1] if quick else SYNTHESIS_SAMPLES
+    for kind in ("Sine", "Square", "Sawtooth"):
+        params = WaveformParams(waveform=kind)
+        for n in sizes:
+            best, median = best_of(lambda: execution_samples(params, step=params.period / n), 3 if quick else 7)
+            results.append({"waveform": kind, "samples": n, "best_s": best, "median_s": median,
+                            "samples_per_s": n / best})
+        rate = achievable_rate("GPIB0::24::INSTR", list_mode=False)
+        best, median = best_of(lambda: adaptive_samples(params, rate, MAX_ERROR), 3)
+        results.append({"waveform": kind, "adaptive": True, "rate": rate, "best_s": best, "median_s": median})
+    return results
+
+
+def bench_preview(quick):
+    """Preview render time (plot_waveform + a full canvas draw) against repeat count."""
+    from PyQt5.QtWidgets import QApplication
+    from main2 import KeithleyPanel
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    connections = ConnectionManager(simulate=True)
+    panel = KeithleyPanel("ASRL4::INSTR", "benchmark", "Benchmark", connections)
+    try:
+        start = time.perf_counter()
+        panel.plot_waveform()
+        panel.plot_area.canvas.draw()
+        first = time.perf_counter() - start   # includes loading matplotlib
+
+        results = []
+        for repeats in PREVIEW_REPEATS[:3] if quick else PREVIEW_REPEATS:
+            panel.repeat_input.setText(str(repeats))
+
+            def render():
+                panel.plot_waveform()
+                panel.plot_area.canvas.draw()
+                app.processEvents()
+
+            best, median = best_of(render, 3 if quick else 5)
+            results.append({"repeat_count": repeats, "best_s": best, "median_s": median})
+        return {"first_preview_s": first, "by_repeat_count": results}
+    finally:
+        panel.shutdown()
+        connections.close_all()
+
+
+def schedule_stats(result):
+    """Send/start time errors against the nominal grid, from RunResult.sample_times."""
+    if result.sample_times is None or not len(result.sample_times[0]):
+        return {}
+    k, t = result.sample_times
+    errors = t - t[0] - (k - k[0]) * result.interval
+    jitter = errors - errors.mean()
+    return {"sends": int(k.size), "jitter_std_s": float(jitter.std()),
+            "jitter_p99_s": float(np.percentile(np.abs(jitter), 99)),
+            "max_lateness_s": float(errors.max())}
+
+
+def bench_execution(name, resource, list_mode, sweeps, pipeline, repeat_count):
+    """Run a 1 Hz sine on a simulated instrument through run_waveform."""
+    sim = SimulatedSourceMeter(resource)
+    instrument = ShadowedInstrument(sim)
+    configure_voltage_source(instrument)
+    instrument.write("OUTP ON")
+
+    params = WaveformParams(waveform="Sine", repeat_count=repeat_count)
+    samples = plan_samples(params, resource, list_mode, MAX_ERROR)
+    expected = samples.expected_duration(repeat_count)
+    run_start = time.perf_counter() - sim.origin
+
+    start = time.perf_counter()
+    result = run_waveform(instrument, samples.v, samples.interval, repeat_count, params.resolution,
+                          RunControl(), list_mode=list_mode, sweeps=sweeps, pipeline=pipeline,
+                          arm_bus_trigger=not list_mode, echo=False)
+    elapsed = time.perf_counter() - start
+
+    # Output as the instrument produced it: first and last change after the run started
+    times, _ = sim.timeline()
+    times = times[times >= run_start]
+    output_span = float(times[-1] - times[0]) if times.size > 1 else 0.0
+    nominal_span = (result.samples - 1) * samples.interval
+
+    entry = {"mode": name, "resource": resource, "path": result.mode, "samples": result.samples,
+             "interval_s": samples.interval, "writes": result.writes,
+             "expected_s": expected, "elapsed_s": elapsed,
+             "duration_error_s": elapsed - expected, "duration_error_pct": 100 * (elapsed - expected) / expected,
+             "setpoints_per_s": result.samples / elapsed,
+             "output_span_s": output_span, "output_span_error_s": output_span - nominal_span,
+             "instrument_errors": sim.error_codes(), "input_overflows": sim.overflows}
+    entry.update(schedule_stats(result))
+    if result.timing is not None:
+        entry.update({"late": result.timing.late, "skipped": result.timing.skipped})
+    return entry
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark synthesis, preview and transmission (headless)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON file to write")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and single-cycle runs")
+    parser.add_argument("--label", help="free-form name for this run (e.g. a branch)")
+    parser.add_argument("--only", choices=("synthesis", "preview", "execution"), action="append",
+                        help="run only these sections (repeatable)")
+    args = parser.parse_args(argv)
+    sections = args.only or ["synthesis", "preview", "execution"]
+
+    report = {"label": args.label, "revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "platform": platform.platform(),
+              "numpy": np.__version__, "quick": args.quick}
+    if "synthesis" in sections:
+        print("synthesis...", file=sys.stderr)
+        report["synthesis"] = bench_synthesis(args.quick)
+    if "preview" in sections:
+        print("preview...", file=sys.stderr)
+        report["preview"] = bench_preview(args.quick)
+    if "execution" in sections:
+        report["execution"] = []
+        for mode in EXECUTION_MODES:
+            print(f"execution: {mode[0]}...", file=sys.stderr)
+            report["execution"].append(bench_execution(*mode, repeat_count=1 if args.quick else 2))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from batching import CommandBatch
+
+
+TRACE_MAX_POINTS = 2500          # 2400 trace buffer size
+TRACE_ELEMENTS = ("VOLT", "CURR", "TIME")
+
+
+class Measurement:
+    """Readings fetched from the trace buffer, one array per element."""
+
+    def __init__(self, voltage, current, timestamp, truncated=False):
+        self.voltage = voltage
+        self.current = current
+        self.timestamp = timestamp
+        self.truncated = truncated   # the run produced more readings than the buffer holds
+
+    def __len__(self):
+        return len(self.voltage)
+
+    def summary(self):
+        if not len(self):
+            return "no readings"
+        text = (f"{len(self)} readings, I {self.current.min():.3e}..{self.current.max():.3e} A")
+        if self.truncated:
+            text += f" (buffer full at {TRACE_MAX_POINTS})"
+        return text
+
+
+def arm_trace(instrument, expected_readings):
+    """Clear the trace buffer and store the next readings of the trigger model.
+
+    Returns the number of readings that will be kept.
+    """
+    points = int(min(max(expected_readings, 1), TRACE_MAX_POINTS))
+    with CommandBatch(instrument) as batch:
+        batch.write("TRAC:CLE")
+        batch.write(f"TRAC:POIN {points}")
+        batch.write("TRAC:FEED SENS")
+        batch.write("TRAC:FEED:CONT NEXT")
+    return points
+
+
+def fetch_trace(instrument, truncated=False):
+    """Read every stored reading in one binary TRAC:DATA? transfer."""
+    stored = int(float(instrument.query("TRAC:POIN:ACT?")))   # fewer if the run was stopped
+    if stored <= 0:
+        empty = np.zeros(0)
+        return Measurement(empty, empty, empty)
+    with CommandBatch(instrument) as batch:
+        batch.write(f"FORM:ELEM {','.join(TRACE_ELEMENTS)}")
+        batch.write("FORM:DATA SREAL")
+        batch.write("FORM:BORD SWAP")   # little-endian float32
+    try:
+        # data_points lets pyvisa read the exact byte count of the "#0" block,
+        # which matters on RS-232 where a float can contain the \n terminator
+        data = instrument.query_binary_values(
+            "TRAC:DATA?", datatype="f", is_big_endian=False, container=np.array,
+            data_points=stored * len(TRACE_ELEMENTS))
+    finally:
+        with CommandBatch(instrument) as batch:
+            batch.write("FORM:DATA ASC")
+            batch.write("TRAC:FEED:CONT NEV")
+    data = np.asarray(data, dtype=np.float64).reshape(-1, len(TRACE_ELEMENTS))
+    return Measurement(data[:, 0], data[:, 1], data[:, 2], truncated)
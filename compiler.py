@@ -0,0 +1,299 @@
+import numpy as np
+
+
+# Keithley 2400 source memory limits
+LIST_MAX_POINTS = 100          # max points per SOUR:LIST:VOLT
+LIST_POINT_BYTES = len("-10.0000,")   # worst-case bytes per value in SOUR:LIST:VOLT
+SWEEP_MAX_POINTS = 2500        # max SOUR:SWE:POIN
+MAX_SOURCE_DELAY = 9999.999    # SOUR:DEL upper bound (s)
+VOLT_LIMIT = 21.0              # 20 V range incl. overrange
+# Time the trigger model spends per list point besides the source delay
+# (settling + a fast measurement). Subtracted from the requested step.
+LIST_POINT_OVERHEAD = 0.002
+# Shorter ramps / holds are cheaper to leave in a list than to switch modes for
+MIN_SWEEP_POINTS = 20
+MIN_HOLD_POINTS = 10
+# ARM:COUN x TRIG:COUN can't exceed the 2400's 2500-reading limit
+TRIGGER_MAX_PRODUCT = 2500
+
+
+def quantize(voltages, resolution):
+    """Round voltages to the output resolution (same rule as the streaming loop)."""
+    voltages = np.asarray(voltages, dtype=float)
+    if not resolution or resolution <= 0:
+        return voltages.copy()
+    return np.round(voltages / resolution) * resolution
+
+
+class SetpointSegments:
+    """Quantized waveform as runs of identical setpoints.
+
+    `levels[i]` is held for `counts[i]` sample intervals, so only the
+    level changes need a SOUR:VOLT write.
+    """
+
+    def __init__(self, levels, counts, interval):
+        self.levels = levels
+        self.counts = counts
+        self.interval = interval
+
+    def __len__(self):
+        return len(self.levels)
+
+    @property
+    def sample_count(self):
+        return int(self.counts.sum())
+
+    @property
+    def holds(self):
+        return self.counts * self.interval
+
+    def segments(self):
+        """(voltage, hold_duration) pairs."""
+        return list(zip(self.levels.tolist(), self.holds.tolist()))
+
+
+def compact_setpoints(voltages, interval, resolution):
+    """Quantize and run-length encode a waveform into SetpointSegments."""
+    v = quantize(voltages, resolution)
+    if v.size == 0:
+        return SetpointSegments(v, np.zeros(0, dtype=np.int64), interval)
+    starts = np.concatenate(([0], np.flatnonzero(v[1:] != v[:-1]) + 1))
+    counts = np.diff(np.append(starts, v.size))
+    return SetpointSegments(v[starts], counts, interval)
+
+
+class EncodedSetpoints:
+    """SetpointSegments compiled to ready-to-write SCPI bytes.
+
+    `table[k]` is the terminated `SOUR:VOLT` command for the k-th distinct
+    quantization level and `codes[i]` indexes it for segment i, so each
+    level is formatted and encoded once however often it repeats.
+    """
+
+    def __init__(self, segments, table, codes):
+        self.segments = segments
+        self.table = table
+        self.codes = codes
+
+    def commands(self):
+        """One bytes object per segment, shared between equal levels."""
+        table = self.table
+        return [table[k] for k in self.codes.tolist()]
+
+
+def encode_setpoints(segments, termination="\n"):
+    """Build the per-level command table for `segments` (already quantized)."""
+    # + 0.0 folds -0.0 into 0.0, which np.unique treats as the same level
+    levels, codes = np.unique(segments.levels + 0.0, return_inverse=True)
+    table = [f"SOUR:VOLT {v:.4f}{termination}".encode("ascii") for v in levels.tolist()]
+    return EncodedSetpoints(segments, table, codes.reshape(-1))
+
+
+class ListSegment:
+    """Arbitrary points played from SOUR:LIST:VOLT."""
+
+    kind = "list"
+
+    def __init__(self, values):
+        self.values = values
+
+    @property
+    def points(self):
+        return len(self.values)
+
+    def levels(self):
+        return np.asarray(self.values, dtype=float)
+
+    def command(self):
+        return "SOUR:LIST:VOLT " + ",".join(f"{v:.4f}" for v in self.values)
+
+
+class SweepSegment:
+    """A linear staircase the 2400 generates itself (SOUR:VOLT:MODE SWE)."""
+
+    kind = "sweep"
+
+    def __init__(self, start, stop, points):
+        self.start = start
+        self.stop = stop
+        self.points = points
+
+    def levels(self):
+        return np.linspace(self.start, self.stop, self.points)
+
+    def commands(self):
+        return [
+            f"SOUR:VOLT:STAR {self.start:.4f}",
+            f"SOUR:VOLT:STOP {self.stop:.4f}",
+            f"SOUR:SWE:POIN {self.points}",
+        ]
+
+
+class HoldSegment:
+    """A flat run held in fixed mode while the host waits."""
+
+    kind = "hold"
+
+    def __init__(self, level, points):
+        self.level = level
+        self.points = points
+
+    def levels(self):
+        return np.full(self.points, self.level)
+
+
+class InstrumentProgram:
+    """A waveform compiled into segments the 2400 plays from its own memory."""
+
+    def __init__(self, segments, interval, source_delay):
+        self.segments = segments
+        self.interval = interval
+        self.source_delay = source_delay
+
+    @property
+    def point_count(self):
+        return sum(seg.points for seg in self.segments)
+
+    @property
+    def duration(self):
+        return self.point_count * self.interval
+
+    @property
+    def triggered_points(self):
+        """Points played by the trigger model (each one takes a reading)."""
+        return sum(seg.points for seg in self.segments if seg.kind != "hold")
+
+    def count(self, kind):
+        return sum(1 for seg in self.segments if seg.kind == kind)
+
+    def arm_counts(self, repeat_count):
+        """ARM:COUN per INIT for repeating a lone played segment in the instrument.
+
+        Returns None when the program can't be repeated that way.
+        """
+        if len(self.segments) != 1 or self.segments[0].kind == "hold":
+            return None
+        per_init = max(1, TRIGGER_MAX_PRODUCT // self.segments[0].points)
+        full, rest = divmod(repeat_count, per_init)
+        return [per_init] * full + ([rest] if rest else [])
+
+    def describe(self):
+        return (f"{self.point_count} points in {len(self.segments)} segment(s): "
+                f"{self.count('sweep')} sweep, {self.count('list')} list, {self.count('hold')} hold")
+
+
+def find_ramps(voltages, tolerance, min_points=MIN_SWEEP_POINTS, max_points=SWEEP_MAX_POINTS):
+    """Index ranges [start, stop] (inclusive) of linear, non-flat ramps.
+
+    Candidates are runs of near-constant first differences; each is then
+    split until every point lies within `tolerance` of the straight line
+    between the range endpoints.
+    """
+    v = np.asarray(voltages, dtype=float)
+    if v.size < min_points:
+        return []
+    d = np.diff(v)
+    same = (np.abs(np.diff(d)) <= 2 * tolerance) & (d[1:] != 0)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], same.astype(np.int8), [0]))))
+    ramps = []
+    pending = [(a, b + 1) for a, b in zip(edges[0::2], edges[1::2])]  # point indices
+    while pending:
+        start, stop = pending.pop()
+        if stop - start + 1 < min_points:
+            continue
+        line = np.linspace(v[start], v[stop], stop - start + 1)
+        deviation = np.abs(v[start:stop + 1] - line)
+        worst = int(np.argmax(deviation))
+        if deviation[worst] > tolerance:
+            pending.append((start, start + worst))
+            pending.append((start + worst + 1, stop))
+            continue
+        ramps.append((start, stop))
+
+    # Adjacent candidates can share a vertex; give it to the earlier ramp
+    result = []
+    last = -1
+    for start, stop in sorted(ramps):
+        start = max(start, last + 1)
+        for a in range(start, stop + 1, max_points):
+            b = min(a + max_points - 1, stop)
+            if b - a + 1 >= min_points:
+                result.append((int(a), int(b)))
+                last = b
+    return result
+
+
+def compile_instrument_program(voltages, interval, resolution, sweeps=True, max_points=LIST_MAX_POINTS,
+                               holds=True):
+    """Compile a waveform into list, sweep and hold segments.
+
+    With `sweeps`, linear ramps become native sweeps and (unless `holds`
+    is False) long flat runs become fixed-level holds; everything else
+    goes into source-memory lists. Holds aren't triggered, so they take no
+    readings: compile with holds=False when every point must be measured.
+    Returns None when the waveform can't be played from the instrument
+    (empty, non-finite or out-of-range values, or a step the source delay
+    can't express); callers should stream it point by point instead.
+    """
+    raw = np.asarray(voltages, dtype=float)
+    v = quantize(raw, resolution)
+    if v.size == 0 or not np.all(np.isfinite(v)):
+        return None
+    if np.max(np.abs(v)) > VOLT_LIMIT:
+        return None
+    if not np.isfinite(interval) or interval <= 0:
+        return None
+    source_delay = max(0.0, interval - LIST_POINT_OVERHEAD)
+    if source_delay > MAX_SOURCE_DELAY:
+        return None
+
+    # Claim ramps first, then flat runs outside them; the rest is list data
+    special = {}
+    taken = np.zeros(v.size, dtype=bool)
+    if sweeps:
+        for a, b in find_ramps(raw, max(resolution, 1e-9) / 2):
+            special[a] = SweepSegment(float(v[a]), float(v[b]), int(b - a + 1))
+            taken[a:b + 1] = True
+        runs = compact_setpoints(v, interval, resolution)
+        starts = np.concatenate(([0], np.cumsum(runs.counts)[:-1]))
+        for start, level, count in zip(starts.tolist(), runs.levels.tolist(), runs.counts.tolist()):
+            if holds and count >= MIN_HOLD_POINTS and not taken[start:start + count].any():
+                special[start] = HoldSegment(level, count)
+                taken[start:start + count] = True
+
+    segments = []
+    i = 0
+    while i < v.size:
+        if i in special:
+            seg = special[i]
+            segments.append(seg)
+            i += seg.points
+            continue
+        j = i
+        while j < v.size and not taken[j] and j - i < max_points:
+            j += 1
+        segments.append(ListSegment(v[i:j]))
+        i = j
+    return InstrumentProgram(merge_short_segments(segments, max_points), interval, source_delay)
+
+
+def merge_short_segments(segments, max_points=LIST_MAX_POINTS):
+    """Join runs of neighbouring segments that fit in one list together.
+
+    Each segment boundary costs a host round trip (completion, upload of
+    the next segment, INIT) while the output holds its last point, so a
+    few short sweeps and holds play on time only as a single list.
+    """
+    merged = []
+    group = []
+    for seg in segments + [None]:
+        if seg is None or (group and sum(s.points for s in group) + seg.points > max_points):
+            if len(group) > 1:
+                merged.append(ListSegment(np.concatenate([s.levels() for s in group])))
+            else:
+                merged.extend(group)
+            group = []
+        if seg is not None:
+            group.append(seg)
+    return merged
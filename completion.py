@@ -0,0 +1,104 @@
+import time
+
+from telemetry import telemetry_of
+
+
+POLL_INTERVAL = 0.05          # s between status checks once an operation is due
+COMPLETION_MARGIN = 5.0       # s past the expected end before giving up
+
+ESE_OPC = 1                   # *ESE bit: operation complete
+STB_ESB = 32                  # status byte: standard event summary
+SRQ_INTERFACES = ("GPIB", "USB")
+
+
+def _srq_event():
+    """(event type, mechanism) for queued VISA service requests."""
+    from pyvisa import constants   # only needed once SRQ is actually used
+    return constants.EventType.service_request, constants.EventMechanism.queue
+
+
+class CompletionWaiter:
+    """Detect the end of an operation from the status system instead of *OPC?.
+
+    `start()` sends an operation with a trailing *OPC, so the OPC event
+    bit is set once every pending command (INIT included) has finished. With
+    *ESE 1 / *SRE 32 that bit raises a service request: on GPIB/USB the
+    waiter blocks on the VISA SRQ event in short slices (so a stop still
+    gets through); on serial, which has no SRQ line, it sleeps until the
+    operation is due and then polls the status byte.
+    """
+
+    def __init__(self, instrument, poll_interval=POLL_INTERVAL, margin=COMPLETION_MARGIN):
+        self.instrument = instrument
+        self.poll_interval = poll_interval
+        self.margin = margin
+        name = str(getattr(instrument, "resource_name", "")).upper()
+        self.srq = name.startswith(SRQ_INTERFACES) and hasattr(instrument, "wait_on_event")
+        self._enabled = False
+
+    def start(self, batch, *commands):
+        """Send `commands` through `batch`, followed by *OPC.
+
+        *CLS goes first so an OPC left over from an aborted operation
+        can't complete this one early.
+        """
+        if not self._enabled:
+            batch.write(f"*ESE {ESE_OPC}")
+            batch.write(f"*SRE {STB_ESB}")
+            if self.srq:
+                self.instrument.enable_event(*_srq_event())
+            self._enabled = True
+        if self.srq:
+            self.instrument.discard_events(*_srq_event())
+        batch.write("*CLS")
+        for command in commands:
+            batch.write(command)
+        batch.write("*OPC")
+        batch.flush()
+
+    def _clear(self):
+        # The event registers are reset by the next start()'s *CLS; only
+        # the SRQ line needs a serial poll now
+        if self.srq:
+            self.instrument.read_stb()
+
+    def _done(self, timeout):
+        """Wait up to `timeout` s for the OPC event; True once it happened."""
+        if self.srq:
+            event_type, _ = _srq_event()
+            response = self.instrument.wait_on_event(event_type, max(1, int(timeout * 1000)), capture_timeout=True)
+            return not response.timed_out
+        if int(self.instrument.query("*STB?")) & STB_ESB:
+            return True
+        time.sleep(timeout)
+        return False
+
+    def wait(self, expected_duration, control=None):
+        """Block until the armed operation completes.
+
+        Returns False if `control` was stopped first; the trigger model is
+        then aborted. Raises TimeoutError well past `expected_duration`.
+        """
+        started = time.monotonic()
+        give_up = started + expected_duration + self.margin
+        telemetry = telemetry_of(self.instrument)
+        if not self.srq:
+            # Nothing to poll for until the operation is due
+            if control is None:
+                time.sleep(expected_duration)
+            elif not control.sleep(expected_duration):
+                self.instrument.write("ABOR")
+                return False
+        while not self._done(self.poll_interval):
+            if telemetry is not None:
+                telemetry.count("completion_polls")   # checked again: still running
+            if control is not None and control.stopped:
+                self.instrument.write("ABOR")
+                return False
+            if time.monotonic() > give_up:
+                raise TimeoutError(f"Instrument did not complete within {expected_duration + self.margin:.1f} s")
+        self._clear()
+        if telemetry is not None:
+            # How long after it was due the end was noticed
+            telemetry.record("completion overrun", max(time.monotonic() - started - expected_duration, 0.0))
+        return True
@@ -0,0 +1,131 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from shadow import ShadowedInstrument
+from simulator import SimulatedSourceMeter, simulated_resource
+from telemetry import MonitoredInstrument, Telemetry
+
+
+PROBE_TIMEOUT_MS = 1500     # open + *IDN? while probing, so absent devices fail fast
+IO_TIMEOUT_MS = 10000       # normal operation once the instrument answered
+SERIAL_BAUD_RATE = 9600
+MAX_PARALLEL_OPENS = 8
+
+
+class Connection:
+    """An open, verified instrument session."""
+
+    def __init__(self, resource, instrument, idn):
+        self.resource = resource
+        self.instrument = instrument   # ShadowedInstrument over a MonitoredInstrument
+        self.idn = idn
+
+    @property
+    def telemetry(self):
+        return self.instrument.telemetry
+
+    @property
+    def model(self):
+        """Manufacturer and model from the *IDN? reply."""
+        return " ".join(self.idn.split(",")[:2]).strip() or self.idn
+
+
+class ConnectionManager:
+    """Opens instruments in the background, one session per resource.
+
+    All sessions come from a single ResourceManager. `connect()` returns a
+    Future immediately; resources are opened concurrently with a short
+    probe timeout and must answer *IDN? before they count as connected, so
+    an absent device costs one probe timeout in the background instead of
+    blocking startup. Connecting to a resource twice returns the same
+    session; a failed resource is retried on the next `connect()`.
+
+    Resources named SIM::<resource> (or every resource, with `simulate`)
+    open a SimulatedSourceMeter with that resource's link timing instead.
+    """
+
+    def __init__(self, probe_timeout_ms=PROBE_TIMEOUT_MS, io_timeout_ms=IO_TIMEOUT_MS,
+                 max_workers=MAX_PARALLEL_OPENS, simulate=False):
+        self.simulate = simulate
+        self.probe_timeout_ms = probe_timeout_ms
+        self.io_timeout_ms = io_timeout_ms
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._rm = None
+        self._futures = {}    # resource -> Future[Connection]
+        self._executor = None
+
+    @property
+    def resource_manager(self):
+        with self._lock:
+            if self._rm is None:
+                import pyvisa   # the VISA backend loads with the first connection, not at startup
+                self._rm = pyvisa.ResourceManager()
+            return self._rm
+
+    def connect(self, resource):
+        """Future resolving to a Connection (or raising why it failed)."""
+        with self._lock:
+            future = self._futures.get(resource)
+            if future is None or (future.done() and future.exception() is not None):
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="visa-open")
+                future = self._executor.submit(self._open, resource)
+                self._futures[resource] = future
+            return future
+
+    def connect_all(self, resources):
+        return {resource: self.connect(resource) for resource in resources}
+
+    def _open(self, resource):
+        simulated = simulated_resource(resource)
+        if simulated is not None or self.simulate:
+            instrument = SimulatedSourceMeter(simulated or resource)
+        else:
+            instrument = self.resource_manager.open_resource(resource, open_timeout=self.probe_timeout_ms)
+        try:
+            if resource.upper().startswith("ASRL"):
+                instrument.baud_rate = SERIAL_BAUD_RATE
+            instrument.write_termination = '\n'
+            instrument.read_termination = '\n'
+            instrument.timeout = self.probe_timeout_ms
+            idn = instrument.query("*IDN?").strip()
+            instrument.timeout = self.io_timeout_ms
+        except Exception:
+            instrument.close()
+            raise
+        monitored = MonitoredInstrument(instrument, Telemetry(resource))
+        return Connection(resource, ShadowedInstrument(monitored), idn)
+
+    def close_all(self):
+        """Close every open session and the ResourceManager; later connects start over."""
+        with self._lock:
+            futures, self._futures = self._futures, {}
+            rm, self._rm = self._rm, None
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for future in futures.values():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                try:
+                    future.result().instrument.close()
+                except Exception:
+                    pass
+        if rm is not None:
+            try:
+                rm.close()
+            except Exception:
+                pass
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_manager():
+    """The process-wide ConnectionManager used by the apps."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ConnectionManager()
+        return _shared
@@ -0,0 +1,499 @@
+import threading
+import time
+
+import numpy as np
+
+from batching import CommandBatch, PipelinedWriter
+from capture import arm_trace, fetch_trace
+from completion import CompletionWaiter
+from compiler import (LIST_MAX_POINTS, LIST_POINT_BYTES, LIST_POINT_OVERHEAD, compact_setpoints,
+                      compile_instrument_program, encode_setpoints)
+from runlog import HELD
+from scheduler import DeadlineScheduler, STRETCH, sleep_until
+from shadow import ShadowedInstrument
+from telemetry import telemetry_of
+from waveform import adaptive_samples
+
+
+# Setpoints/s the 2400 command parser sustains when the bus isn't the bottleneck
+INSTRUMENT_COMMAND_RATE = 300.0
+SETPOINT_COMMAND_BYTES = len("SOUR:VOLT -10.0000\n")
+GPIB_BYTE_TIME = 1e-6            # s per byte on GPIB/USB (~1 MB/s)
+LIST_VALUE_PARSE_TIME = 1e-4     # s the parser spends per SOUR:LIST:VOLT value
+LIST_SEGMENT_COMMANDS = 6        # mode, list, TRIG:COUN, *CLS, INIT, *OPC per loaded list
+
+
+def link_byte_time(resource_str, baud_rate=9600):
+    """Seconds per byte on the link (10 bits per byte on RS-232)."""
+    if resource_str.upper().startswith("ASRL"):
+        return 10 / baud_rate
+    return GPIB_BYTE_TIME
+
+
+def achievable_rate(resource_str, list_mode=False, baud_rate=9600):
+    """Rough setpoints/s a run can sustain on this transport.
+
+    Instrument-played programs are limited by the trigger model (their
+    upload is a separate cost, see list_upload_time); streamed setpoints
+    by the bus and the parser.
+    """
+    if list_mode:
+        return 1.0 / LIST_POINT_OVERHEAD
+    return min(INSTRUMENT_COMMAND_RATE, 1.0 / (SETPOINT_COMMAND_BYTES * link_byte_time(resource_str, baud_rate)))
+
+
+def list_upload_time(resource_str, points, baud_rate=9600):
+    """Rough seconds to load `points` list values, in LIST_MAX_POINTS chunks, before they play."""
+    chunks = -(-points // LIST_MAX_POINTS)
+    per_value = LIST_POINT_BYTES * link_byte_time(resource_str, baud_rate) + LIST_VALUE_PARSE_TIME
+    return points * per_value + chunks * LIST_SEGMENT_COMMANDS / INSTRUMENT_COMMAND_RATE
+
+
+def plan_samples(params, resource_str, list_mode, max_error, baud_rate=9600):
+    """AdaptiveSamples for a run of `params` on this transport.
+
+    In list mode a cycle is kept to one LIST_MAX_POINTS list: it is then
+    uploaded once and repeated by the trigger model without gaps, where a
+    longer cycle would be re-uploaded chunk by chunk every cycle with the
+    output frozen during each upload. The upload is part of the expected
+    duration.
+    """
+    rate = achievable_rate(resource_str, list_mode, baud_rate)
+    if not list_mode:
+        return adaptive_samples(params, rate, max_error)
+    samples = adaptive_samples(params, rate, max_error, max_samples=LIST_MAX_POINTS)
+    samples.upload_time = list_upload_time(resource_str, samples.sample_count, baud_rate)
+    return samples
+
+
+class RunControl:
+    """Thread-safe pause/stop flags and progress reporting for one run."""
+
+    def __init__(self, on_progress=None, progress_interval=0.05):
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+        self._last_progress = 0.0
+        self.reset()
+
+    def reset(self):
+        self._stopped.clear()
+        self._running.set()
+        self._last_progress = 0.0
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._running.set()  # wake a paused run so it can exit
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def keep_going(self):
+        """Block while paused; return False once the run has been stopped."""
+        self._running.wait()
+        return not self._stopped.is_set()
+
+    def sleep(self, duration):
+        """Wait `duration` seconds; return False early if the run is stopped."""
+        return not self._stopped.wait(duration)
+
+    def progress(self, done, total):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if done >= total or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.on_progress(done, total)
+
+
+VOLTAGE_SOURCE_SETUP = (
+    ("SOUR:FUNC", "VOLT"),
+    ("SOUR:VOLT:RANG", "20"),  # Adjust voltage range as needed
+    ("SOUR:VOLT:MODE", "FIXED"),
+    ("SENS:CURR:PROT", "0.1"),
+)
+
+
+def configure_voltage_source(instrument, force=False):
+    """Put the 2400 in fixed-voltage source mode.
+
+    On a ShadowedInstrument that is already configured, *RST/*CLS are
+    skipped and only settings that differ from the shadow are written, so
+    back-to-back runs don't glitch the output. A trigger model left armed
+    (e.g. by a streamed run's bus-trigger INIT) is still aborted, since the
+    next INIT would be refused with -213 otherwise. `force` always resets.
+    The setup goes out as one batched transfer, confirmed by a single *OPC?.
+    """
+    shadowed = isinstance(instrument, ShadowedInstrument)
+    with CommandBatch(instrument, verify=True) as batch:
+        if force or not shadowed or not instrument.synced:
+            if shadowed:
+                instrument.invalidate()   # *RST is still queued; don't trust the shadow
+            batch.write("*RST")  # 초기화
+            batch.write("*CLS")
+        else:
+            batch.write("ABOR")
+        for header, value in VOLTAGE_SOURCE_SETUP:
+            batch.ensure(header, value)
+    if shadowed:
+        instrument.synced = True
+
+
+def stream_setpoints(instrument, segments, repeat_count, control, policy=STRETCH, log=None,
+                     pipeline=False, start_at=None):
+    """Host-timed fallback: write each setpoint change on a deadline schedule.
+
+    Runs of identical setpoints (including across repeat boundaries) are
+    held instead of rewritten. The commands are encoded once up front
+    (see encode_setpoints) and every repeat writes the same raw bytes.
+    Each write is logged to `log` (a RunLogger) after it has gone out.
+    With `pipeline`, writes are handed to a PipelinedWriter so the next
+    command is prepared while the current one is on the bus; once it is
+    closed, the timing report and log are corrected from enqueue times to
+    the times the writes actually started. With
+    `start_at` (a perf_counter time), sample 0 is due at that instant
+    instead of immediately. Returns (TimingReport, number of writes,
+    samples played), the last short of the plan when the run is stopped.
+    """
+    termination = getattr(instrument, "write_termination", None) or "\n"
+    encoded = encode_setpoints(segments, termination)
+    if not pipeline:
+        return _stream(instrument.write_raw, encoded, repeat_count, control, policy, log, start_at)
+    first_record = len(log) if log is not None else 0
+    with PipelinedWriter(instrument.write_raw) as writer:
+        timing, writes, played = _stream(writer.send, encoded, repeat_count, control, policy, log, start_at)
+    sent_at = writer.sent_at[:writes]
+    timing.retime(sent_at)
+    if log is not None:
+        log.set_sent_at(first_record, sent_at)
+    return timing, writes, played
+
+
+def _stream(send, encoded, repeat_count, control, policy, log, start_at):
+    segments = encoded.segments
+    scheduler = DeadlineScheduler(segments.interval, policy)
+    if start_at is not None:
+        scheduler.start(start_at)
+    clock = scheduler.clock
+    if log is not None and not len(log):
+        log.start(scheduler.t0)
+    levels = segments.levels.tolist()
+    counts = segments.counts.tolist()
+    commands = encoded.commands()
+    total = segments.sample_count * repeat_count
+    done = 0
+    writes = 0
+    last = None
+    for _ in range(repeat_count):
+        for v, count, command in zip(levels, counts, commands):
+            if control.paused:
+                paused_at = clock()
+                if not control.keep_going():
+                    return scheduler.finish(wait=False), writes, done
+                scheduler.hold(clock() - paused_at)
+            elif control.stopped:
+                return scheduler.finish(wait=False), writes, done
+            done += count
+            if v == last:
+                scheduler.advance(count)
+                if log is not None:
+                    log.skip(count)
+            elif scheduler.wait_slot(count):
+                sent_at = clock()
+                scheduler.mark_sent(sent_at)
+                send(command)
+                if log is not None:
+                    log.append(v, sent_at, count)
+                writes += 1
+                last = v
+            elif log is not None:
+                log.skip(count)
+            control.progress(done, total)
+    return scheduler.finish(), writes, done
+
+
+def run_instrument_program(instrument, program, repeat_count, control, log=None, start_at=None):
+    """Play a compiled InstrumentProgram from the 2400's own memory.
+
+    Lists and sweeps are armed with TRIG:COUN and played by the trigger
+    model; holds switch to fixed mode and wait on the host. The run can
+    only be paused or stopped between segments. Each segment's setup,
+    INIT and *OPC go out as one batched transfer and its end is detected
+    by a CompletionWaiter (SRQ, or status-byte polling on serial); a stop
+    aborts the segment that is playing. Played points are logged to `log`
+    at INIT time plus their offset in the segment.
+
+    A program that is a single list or sweep is loaded once and repeated
+    by the trigger model itself (ARM:COUN, up to the 2500-reading limit
+    per INIT), so the host only waits for completion.
+
+    This single-list repeat needs the whole cycle in one LIST_MAX_POINTS
+    list; plan_samples keeps list-mode cycles that short.
+
+    Between host-sequenced segments the output holds the last point while
+    the host waits for completion and sends the next segment, a gap of a
+    few ms over GPIB and well over 100 ms on serial. It delays every later
+    segment; RunResult.start_lag reports it.
+
+    With `start_at` (a perf_counter time), the setup is sent early and the
+    first segment starts at that instant. Returns (starts, uploads,
+    played): the (sample index, perf_counter time) at which each segment
+    was started, the setpoint-carrying transfers sent and the samples
+    actually played, which fall short of the program when it is stopped.
+    """
+    batch = CommandBatch(instrument)
+    waiter = CompletionWaiter(instrument)
+    batch.write(f"SOUR:DEL {program.source_delay:.4f}")
+    batch.write("TRIG:SOUR IMM")
+    mode = None
+    uploads = 0
+
+    def set_mode(new_mode):
+        nonlocal mode
+        if new_mode != mode:
+            batch.write(f"SOUR:VOLT:MODE {new_mode}")
+            mode = new_mode
+
+    def load(seg):
+        nonlocal uploads
+        uploads += 1
+        if seg.kind == "list":
+            set_mode("LIST")
+            batch.write(seg.command())
+        elif seg.kind == "sweep":
+            if mode != "SWE":
+                set_mode("SWE")
+                batch.write("SOUR:SWE:SPAC LIN")
+            for command in seg.commands():
+                batch.write(command)
+        else:
+            set_mode("FIXED")
+            batch.write(f"SOUR:VOLT {seg.level:.4f}")
+            return
+        batch.write(f"TRIG:COUN {seg.points}")
+
+    def played_since(started_at, points):
+        """Points of a stopped segment that had played by now."""
+        return min(points, int((time.perf_counter() - started_at) / program.interval))
+
+    def wait_for_start(flush_setup):
+        nonlocal start_at
+        if start_at is None:
+            return
+        if flush_setup:
+            batch.flush()
+        sleep_until(start_at)
+        start_at = None
+
+    segments = program.segments
+    preloaded = len(segments) == 1
+    if preloaded:
+        # Loaded once and re-armed on every repeat
+        load(segments[0])
+
+    total = program.point_count * repeat_count
+    done = 0
+    last = None
+    starts = []
+    arm_counts = program.arm_counts(repeat_count) if repeat_count > 1 else None
+    if log is not None and not len(log):
+        log.start()
+    try:
+        if arm_counts is not None:
+            seg = segments[0]
+            cycle = seg.points * program.interval
+            armed = 1
+            for arms in arm_counts:
+                if not control.keep_going():
+                    return starts, uploads, done
+                if arms != armed:
+                    batch.write(f"ARM:COUN {arms}")
+                    armed = arms
+                wait_for_start(flush_setup=True)
+                waiter.start(batch, "INIT")
+                started_at = time.perf_counter()
+                starts.append((done, started_at))
+                if log is not None:
+                    for k in range(arms):
+                        log_segment(log, seg, started_at + k * cycle, program.interval)
+                if not waiter.wait(arms * cycle, control):
+                    done += played_since(started_at, arms * seg.points)
+                    return starts, uploads, done
+                last = seg.values[-1] if seg.kind == "list" else seg.stop
+                done += arms * seg.points
+                control.progress(done, total)
+            return starts, uploads, done
+        for _ in range(repeat_count):
+            for seg in segments:
+                if not control.keep_going():
+                    return starts, uploads, done
+                if not preloaded:
+                    load(seg)
+                if seg.kind == "hold":
+                    wait_for_start(flush_setup=False)
+                    batch.flush()
+                    started_at = time.perf_counter()
+                    starts.append((done, started_at))
+                    if log is not None:
+                        log.append(seg.level, started_at, seg.points, kind=HELD)
+                    if not control.sleep(seg.points * program.interval):
+                        done += played_since(started_at, seg.points)
+                        return starts, uploads, done
+                    last = seg.level
+                else:
+                    wait_for_start(flush_setup=True)
+                    waiter.start(batch, "INIT")
+                    started_at = time.perf_counter()
+                    starts.append((done, started_at))
+                    if log is not None:
+                        log_segment(log, seg, started_at, program.interval)
+                    if not waiter.wait(seg.points * program.interval, control):
+                        done += played_since(started_at, seg.points)
+                        return starts, uploads, done
+                    last = seg.values[-1] if seg.kind == "list" else seg.stop
+                done += seg.points
+                control.progress(done, total)
+    finally:
+        if arm_counts is not None:
+            batch.write("ARM:COUN 1")
+        # Hold the last played level once we are back in fixed mode
+        if last is not None:
+            batch.write(f"SOUR:VOLT:LEV {last:.4f}")
+        set_mode("FIXED")
+        batch.flush()
+    return starts, uploads, done
+
+
+def log_segment(log, seg, started_at, interval):
+    """Log the points of a played list/sweep segment."""
+    if seg.kind == "list":
+        values = seg.values
+    else:
+        values = np.linspace(seg.start, seg.stop, seg.points)
+    log.extend(values, started_at + np.arange(seg.points) * interval)
+
+
+class RunResult:
+    """What a run_waveform call did: the path taken, write savings and, when
+    host-timed, its timing."""
+
+    def __init__(self, mode, samples, writes, timing=None, measurement=None, sample_times=None, interval=None,
+                 notes=()):
+        self.mode = mode
+        self.samples = samples
+        self.writes = writes
+        self.timing = timing
+        self.measurement = measurement
+        # (sample indices, perf_counter times) at which the host started them
+        if sample_times is None and timing is not None:
+            sample_times = (timing.samples, timing.sent_at)
+        self.sample_times = sample_times
+        self.interval = interval
+        self.notes = list(notes)   # things the caller asked for that didn't happen
+
+    @property
+    def writes_saved(self):
+        return self.samples - self.writes
+
+    @property
+    def start_lag(self):
+        """How late each recorded start was against the first one plus its
+        sample offset, in seconds."""
+        if self.sample_times is None or self.interval is None or not len(self.sample_times[0]):
+            return np.zeros(0)
+        k, t = (np.asarray(a, dtype=float) for a in self.sample_times)
+        return t - t[0] - (k - k[0]) * self.interval
+
+    def summary(self):
+        text = f"{self.mode} mode, {self.writes} writes for {self.samples} samples ({self.writes_saved} saved)"
+        if self.timing is not None:
+            text += f" | {self.timing.summary()}"
+        elif len(self.start_lag) > 1:
+            text += f" | {len(self.start_lag)} segment starts, lag max {self.start_lag.max() * 1e3:.1f} ms"
+        if self.measurement is not None:
+            text += f" | captured {self.measurement.summary()}"
+        for note in self.notes:
+            text += f" | {note}"
+        return text
+
+
+def run_waveform(instrument, voltages, interval, repeat_count, resolution, control,
+                 list_mode=True, sweeps=True, policy=STRETCH, capture=False,
+                 arm_bus_trigger=False, echo=False, log=None, pipeline=False, start_at=None):
+    """Play `voltages` from the instrument's memory when possible, else stream them.
+
+    `sweeps` lets the compiler turn linear ramps into native sweeps and
+    flat runs into fixed-level holds within the instrument program.
+    With `capture`, flat runs are played as list points instead of holds,
+    every point is measured into the trace buffer and fetched in one binary
+    transfer afterwards (streamed setpoints aren't triggered, so they have
+    no readings; the result notes when nothing was captured).
+    `log` is an optional RunLogger that records every commanded setpoint;
+    captured readings are attached to the played records. `pipeline`
+    overlaps streamed writes with preparing the next setpoint. `start_at`
+    is a shared perf_counter time base for synchronized runs (see sync).
+    """
+    program = None
+    if list_mode:
+        # Captured runs measure every point, so flat runs stay triggered list points
+        program = compile_instrument_program(voltages, interval, resolution, sweeps=sweeps, holds=not capture)
+        if (program is not None and repeat_count > 1 and len(program.segments) > 1
+                and len(voltages) <= LIST_MAX_POINTS):
+            # One list the instrument can repeat beats re-uploading sweeps every cycle
+            program = compile_instrument_program(voltages, interval, resolution, sweeps=False)
+    if program is not None:
+        if echo:
+            print(f"Instrument program: {program.describe()}, Repeats: {repeat_count}")
+        readings = program.triggered_points * repeat_count
+        points = arm_trace(instrument, readings) if capture and readings else 0
+        first_record = len(log) if log is not None else 0
+        starts, uploads, played = run_instrument_program(instrument, program, repeat_count, control, log=log,
+                                                         start_at=start_at)
+        measurement = None
+        if points:
+            measurement = fetch_trace(instrument, truncated=readings > points)
+            if log is not None:
+                log.fill_readings(first_record, measurement)
+        sample_times = (np.array([k for k, _ in starts], dtype=np.int64), np.array([t for _, t in starts]))
+        notes = ["nothing captured"] if capture and measurement is None else []
+        # What actually ran: a stopped run falls short of len(voltages) * repeat_count
+        result = RunResult("list", played, uploads, measurement=measurement,
+                           sample_times=sample_times, interval=interval, notes=notes)
+        if telemetry_of(instrument) is not None:
+            telemetry_of(instrument).record_run(result)
+        return result
+
+    segments = compact_setpoints(voltages, interval, resolution)
+    if echo:
+        # Debug print for interval and repeat info
+        print(f"Interval: {interval} s, Repeats: {repeat_count}, Total samples: {len(voltages)}, "
+              f"Setpoint changes: {len(segments)}")
+    if arm_bus_trigger:
+        with CommandBatch(instrument) as batch:
+            batch.write("TRIG:SOUR BUS")
+            batch.write("TRIG:COUN 1")
+            batch.write("INIT")
+    timing, writes, played = stream_setpoints(instrument, segments, repeat_count, control, policy=policy,
+                                      log=log, pipeline=pipeline, start_at=start_at)
+    if arm_bus_trigger:
+        # Nothing triggers the armed model; disarm it so *OPC and the next INIT aren't held up
+        instrument.write("ABOR")
+    notes = ["nothing captured: streamed setpoints take no readings"] if capture else []
+    result = RunResult("stream", played, writes, timing, interval=interval, notes=notes)
+    if echo:
+        print(f"Run: {result.summary()}")
+    if telemetry_of(instrument) is not None:
+        telemetry_of(instrument).record_run(result)
+    return result
@@ -0,0 +1,301 @@
+"""Headless batch runner: run a job file of waveforms and biases without the GUI.
+
+Uses the same execution engine as the apps but never imports PyQt5 or
+matplotlib. A job file is a station file whose steps carry their own
+waveform settings (see jobs.example.json):
+
+    python jobs.py jobs.json
+    python jobs.py jobs.json --simulate -o results.json
+
+Jobs on one instrument run in file order; jobs on different instruments
+run concurrently, each on its own thread.
+"""
+from startup import profile   # first, so the startup profile covers every import
+
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from batching import CommandBatch
+from completion import CompletionWaiter
+from connections import ConnectionManager
+from execution import RunControl, configure_voltage_source, plan_samples, run_waveform
+from runlog import new_log_path, run_logger
+from scheduler import POLICIES, STRETCH
+from shadow import ensure
+from station import InstrumentSpec, Station, Step, StepScheduler
+from waveform import WAVEFORM_TYPES, WaveformParams, execution_samples
+
+
+DEFAULT_MAX_ERROR = 0.002    # V, the panels' default
+LEGACY_INTERVAL = 0.02       # s per fixed sample without adaptive sampling, as in the apps
+
+# Job settings that are not WaveformParams fields, with their defaults (the panels' checkboxes)
+RUN_OPTIONS = {"list_mode": True, "sweeps": True, "adaptive": True, "max_error": DEFAULT_MAX_ERROR,
+               "capture": False, "pipeline": False, "policy": STRETCH, "log": False, "output_off": True}
+
+
+class Job(Step):
+    """A step that carries its own waveform and run settings."""
+
+    def __init__(self, step_id, instrument, action, after=(), voltage=None, params=None, options=None):
+        super().__init__(step_id, instrument, action, after, voltage)
+        self.params = params or WaveformParams()
+        self.options = dict(RUN_OPTIONS, **(options or {}))
+        if self.options["policy"] not in POLICIES:
+            raise ValueError(f"Job {step_id}: unknown late policy {self.options['policy']!r}")
+        if action == "steady" and voltage is None:
+            raise ValueError(f"Job {step_id}: steady needs a voltage")
+
+
+def _setting(job_id, key, value, default):
+    """`value` as the type of `default`, which a JSON value must already have.
+
+    No conversions beyond int -> float: bool("false") is True, and a
+    quoted number is more likely a typo than intended.
+    """
+    if isinstance(default, bool):
+        ok = isinstance(value, bool)
+    elif isinstance(default, int):
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif isinstance(default, float):
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    else:
+        ok = isinstance(value, type(default))
+    if not ok:
+        raise ValueError(f"Job {job_id}: {key} must be {type(default).__name__}, not {json.dumps(value)}")
+    return type(default)(value)
+
+
+def parse_job(item):
+    """A Job from one entry of a job file's "jobs" list."""
+    params = WaveformParams()
+    options = {}
+    job_id = item.get("id")
+    for key, value in item.items():
+        if key in ("id", "instrument", "action", "after", "voltage"):
+            continue
+        if key in RUN_OPTIONS:
+            options[key] = _setting(job_id, key, value, RUN_OPTIONS[key])
+        elif key == "custom":
+            # [[time, voltage], ...]
+            table = np.asarray(value, dtype=float).reshape(-1, 2)
+            params.custom_times, params.custom_voltages = table[:, 0], table[:, 1]
+        elif key == "duty":
+            # percent, as typed in the panels
+            params.duty = _setting(job_id, key, value, 100.0 * params.duty) / 100.0
+        elif key in WaveformParams.__dataclass_fields__:
+            setattr(params, key, _setting(job_id, key, value, getattr(params, key)))
+        else:
+            raise ValueError(f"Job {job_id}: unknown setting {key!r}")
+    if params.waveform not in WAVEFORM_TYPES:
+        raise ValueError(f"Job {job_id}: unknown waveform {params.waveform!r}")
+    if params.waveform == "Custom" and not len(params.custom_times):
+        raise ValueError(f"Job {job_id}: a Custom waveform needs a non-empty \"custom\" table")
+    voltage = item.get("voltage")
+    if voltage is not None:
+        voltage = _setting(job_id, "voltage", voltage, 0.0)
+    return Job(item["id"], item["instrument"], item.get("action", "waveform"), item.get("after", ()),
+               voltage, params, options)
+
+
+def load_jobs(path):
+    """Read a job file (JSON):
+
+        {"instruments": [{"name": "A", "resource": "GPIB0::24::INSTR"}, ...],
+         "jobs": [{"id": "sine", "instrument": "A", "waveform": "Sine", "amplitude": 2,
+                   "frequency": 5, "repeat_count": 100},
+                  {"id": "bias", "instrument": "B", "action": "steady", "voltage": 0.5}, ...]}
+
+    A job without "after" follows the previous job on the same instrument.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    instruments = [InstrumentSpec(item["name"], item["resource"], item.get("title"))
+                   for item in data.get("instruments", [])]
+    if not instruments:
+        raise ValueError(f"{path}: no instruments")
+    jobs = []
+    previous = {}    # instrument -> id of its last job
+    for item in data.get("jobs", []):
+        if "after" not in item and item.get("instrument") in previous:
+            item = dict(item, after=[previous[item["instrument"]]])
+        job = parse_job(item)
+        previous[job.instrument] = job.id
+        jobs.append(job)
+    if not jobs:
+        raise ValueError(f"{path}: no jobs")
+    return Station(instruments, jobs)
+
+
+def job_samples(job, resource):
+    """Voltages and interval a waveform job runs, as the panels compute them."""
+    params, options = job.params, job.options
+    if options["adaptive"]:
+        samples = plan_samples(params, resource, options["list_mode"], options["max_error"])
+        return samples.v, samples.interval
+    _, voltages = execution_samples(params)
+    interval = LEGACY_INTERVAL if job.action == "waveform" else params.period / len(voltages)
+    return voltages, interval
+
+
+def run_job(job, instrument, resource, control):
+    """Run one job on an open session; returns a one-line summary."""
+    options = job.options
+    if job.action == "steady":
+        configure_voltage_source(instrument)
+        instrument.write(f"SOUR:VOLT {job.voltage:.4f}")
+        ensure(instrument, "OUTP", "ON")
+        return f"steady {job.voltage:g} V"
+
+    voltages, interval = job_samples(job, resource)
+    log_path = new_log_path(job.id) if options["log"] else None
+    waveform = job.action == "waveform"
+    if waveform:
+        configure_voltage_source(instrument)
+        if ensure(instrument, "OUTP", "ON"):
+            time.sleep(0.1)  # Wait for the instrument to stabilize
+    with run_logger(log_path, interval) as log:
+        result = run_waveform(instrument, voltages, interval, job.params.repeat_count, job.params.resolution,
+                              control, list_mode=options["list_mode"], sweeps=options["sweeps"],
+                              policy=options["policy"], capture=options["capture"], arm_bus_trigger=waveform,
+                              log=log, pipeline=options["pipeline"])
+    if waveform and options["output_off"]:
+        # Finish only once the instrument has processed everything (avoids 102 errors)
+        waiter = CompletionWaiter(instrument)
+        with CommandBatch(instrument) as batch:
+            waiter.start(batch, "OUTP OFF")
+        try:
+            waiter.wait(0.0)
+        except Exception:
+            pass   # a lost status reply shouldn't fail a finished run
+    summary = result.summary()
+    if log_path is not None:
+        summary += f" | log {log_path}"
+    return summary
+
+
+class BatchRunner:
+    """Runs a job Station's plan on worker threads, one job per instrument at a time.
+
+    With `share_buses`, instruments on one GPIB board or serial port also
+    wait for each other, as in the station GUI.
+    """
+
+    def __init__(self, station, connections, share_buses=False, stream=None):
+        self.station = station
+        self.connections = connections
+        self.stream = stream or sys.stdout
+        bus_of_step = station.bus_of_step if share_buses else (lambda step: step.instrument)
+        self.scheduler = StepScheduler(station.plan, bus_of_step)
+        self.controls = {}     # job id -> RunControl of the running jobs
+        self.results = {}      # job id -> {"state", "summary"/"error", "elapsed_s"}
+        self._lock = threading.Lock()
+
+    def report(self, text):
+        with self._lock:
+            print(f"[{time.strftime('%H:%M:%S')}] {text}", file=self.stream, flush=True)
+
+    def stop(self):
+        """Abort the running jobs; pending ones are skipped."""
+        for control in list(self.controls.values()):
+            control.stop()
+
+    def _run(self, job):
+        resource = self.station.spec(job.instrument).resource
+        started = time.perf_counter()
+        try:
+            connection = self.connections.connect(resource).result()
+            summary = run_job(job, connection.instrument, resource, self.controls[job.id])
+        except Exception as e:
+            return {"state": "failed", "error": str(e), "elapsed_s": time.perf_counter() - started}
+        if self.controls[job.id].stopped:
+            return {"state": "stopped", "summary": summary, "elapsed_s": time.perf_counter() - started}
+        return {"state": "done", "summary": summary, "elapsed_s": time.perf_counter() - started}
+
+    def run(self):
+        """Run every job; returns True when all of them finished."""
+        # Open every instrument up front, concurrently
+        self.connections.connect_all(spec.resource for spec in self.station.instruments)
+        running = {}
+        stopping = False
+        with ThreadPoolExecutor(len(self.station.instruments), thread_name_prefix="job") as executor:
+            while True:
+                if not stopping:
+                    for job in self.scheduler.dispatch():
+                        self.controls[job.id] = RunControl()
+                        running[executor.submit(self._run, job)] = job
+                        self.report(f"{job.id}: {job.action} on {job.instrument} started")
+                if not running:
+                    break
+                try:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    # Let the running jobs stop between samples (and turn the output off)
+                    self.report("Interrupted, stopping running jobs")
+                    stopping = True
+                    self.stop()
+                    continue
+                for future in done:
+                    job = running.pop(future)
+                    result = future.result()
+                    del self.controls[job.id]
+                    self.results[job.id] = result
+                    ok = result["state"] == "done"
+                    self.scheduler.complete(job.id, ok)
+                    self.report(f"{job.id}: {result['state']} after {result['elapsed_s']:.2f} s"
+                                f" | {result.get('summary') or result.get('error')}")
+        self.report(f"Finished: {self.scheduler.summary()}")
+        return not stopping and self.scheduler.ok
+
+    def report_data(self):
+        telemetry = {}
+        for spec in self.station.instruments:
+            future = self.connections.connect(spec.resource)
+            if future.done() and future.exception() is None:
+                telemetry[spec.name] = future.result().telemetry.snapshot(events=0)
+        return {"jobs": {sid: dict({"state": state}, **self.results.get(sid, {}))
+                         for sid, state in self.scheduler.state.items()},
+                "telemetry": telemetry}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a job file of Keithley 2400 waveforms without the GUI")
+    parser.add_argument("jobs", help="job file (JSON) with instruments and jobs")
+    parser.add_argument("--simulate", action="store_true",
+                        help="use simulated SourceMeters instead of the configured instruments")
+    parser.add_argument("--share-buses", action="store_true",
+                        help="run instruments on one GPIB board or serial port one at a time")
+    parser.add_argument("-o", "--output", help="JSON file for job results and per-instrument telemetry")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print an import/initialization time breakdown")
+    args = parser.parse_args(argv)
+    if args.profile_startup:
+        profile.enable()
+    profile.mark("imports")
+
+    station = load_jobs(args.jobs)
+    connections = ConnectionManager(simulate=args.simulate)
+    runner = BatchRunner(station, connections, share_buses=args.share_buses)
+    # Interrupts stop the running jobs cleanly, also when started in the background
+    # (where SIGINT is ignored by default)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    profile.mark("job file loaded")
+    try:
+        ok = runner.run()
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(runner.report_data(), f, indent=2)
+    finally:
+        connections.close_all()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QLabel, QVBoxLayout, QWidget
+
+from startup import profile
+
+
+class LazyCanvas(QWidget):
+    """Placeholder for a matplotlib figure that is only built when first needed.
+
+    Importing matplotlib's Qt backend and creating a FigureCanvas is a large
+    part of startup, so the window shows a label instead until `ensure()`
+    is called (on the first preview), which swaps in the toolbar and canvas.
+    """
+
+    def __init__(self, placeholder_text, figsize=(6, 5), parent=None):
+        super().__init__(parent)
+        self.figsize = figsize
+        self.figure = None
+        self.canvas = None
+        self.toolbar = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.placeholder = QLabel(placeholder_text)
+        self.placeholder.setAlignment(Qt.AlignCenter)
+        self.placeholder.setMinimumHeight(120)
+        layout.addWidget(self.placeholder)
+
+    @property
+    def ready(self):
+        return self.canvas is not None
+
+    def ensure(self):
+        """Create the figure, canvas and toolbar if needed; returns (figure, canvas)."""
+        if self.canvas is None:
+            from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+            from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+            from matplotlib.figure import Figure
+
+            self.figure = Figure(figsize=self.figsize)
+            self.canvas = FigureCanvas(self.figure)
+            self.toolbar = NavigationToolbar(self.canvas, self)
+            layout = self.layout()
+            layout.removeWidget(self.placeholder)
+            self.placeholder.deleteLater()
+            self.placeholder = None
+            layout.addWidget(self.toolbar)
+            layout.addWidget(self.canvas)
+            profile.once("matplotlib loaded, first canvas created")
+        return self.figure, self.canvas
@@ -0,0 +1,202 @@
+import time
+
+import numpy as np
+
+from preview import SampledLOD
+from runlog import PLAYED, STREAMED
+
+
+LIVE_WINDOW = 30.0          # s of history shown by the live view
+LIVE_CAPACITY = 1 << 16     # points kept; caps the window at very high sample rates
+LIVE_FRAME_RATE = 20        # max live-view redraws per second
+
+
+class LiveBuffer:
+    """Bounded ring buffer of the setpoints a run has applied, for live display.
+
+    It takes the same start/skip/append/extend/set_sent_at/fill_readings
+    calls as a RunLogger, so the run loop feeds it through its `log` hook
+    (see runlog.tee_log). Storage is preallocated once: an append is a few
+    scalar stores and an index bump, however long the run.
+
+    One thread writes (the worker), another reads (the GUI). The writer
+    stores a point before publishing it by bumping `_count`, and `window()`
+    drops whatever may have been overwritten while it was copying, so no
+    lock is needed.
+    """
+
+    def __init__(self, capacity=LIVE_CAPACITY):
+        self.capacity = capacity
+        self.sent_at = np.zeros(capacity)                 # perf_counter time
+        self.setpoint = np.zeros(capacity)
+        self.voltage = np.full(capacity, np.nan)          # captured reading, when any
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.played = np.zeros(capacity, dtype=np.int64)  # ordinal among played points
+        self.origin = time.perf_counter()
+        self._count = 0          # points ever appended this run
+        self._played = 0         # played points ever appended this run
+        self._played_at_start = 0
+
+    def __len__(self):
+        return self._count
+
+    def reset(self):
+        """Forget the previous run; the storage is reused."""
+        self._count = self._played = self._played_at_start = 0
+        self.origin = time.perf_counter()
+
+    def start(self, origin=None):
+        self._played_at_start = self._played
+        self.origin = time.perf_counter() if origin is None else origin
+
+    def skip(self, samples):
+        pass
+
+    def append(self, setpoint, sent_at, samples=1, kind=STREAMED):
+        i = self._count % self.capacity
+        self.sent_at[i] = sent_at
+        self.setpoint[i] = setpoint
+        self.voltage[i] = np.nan
+        self.kind[i] = kind
+        self._count += 1
+
+    def extend(self, setpoints, sent_at, kind=PLAYED):
+        n = len(setpoints)
+        setpoints = np.asarray(setpoints, dtype=float)[-self.capacity:]
+        sent_at = np.broadcast_to(np.asarray(sent_at, dtype=float), (n,))[-self.capacity:]
+        first = self._count + n - setpoints.size
+        idx = (first + np.arange(setpoints.size)) % self.capacity
+        self.sent_at[idx] = sent_at
+        self.setpoint[idx] = setpoints
+        self.voltage[idx] = np.nan
+        self.kind[idx] = kind
+        if kind == PLAYED:
+            self.played[idx] = self._played + n - setpoints.size + np.arange(setpoints.size)
+            self._played += n
+        self._count += n
+
+    def set_sent_at(self, first, sent_at):
+        """Correct the send times of the points from `first` on that are still held."""
+        held = max(first, self._count - self.capacity)
+        end = min(self._count, first + len(sent_at))
+        if end > held:
+            idx = np.arange(held, end) % self.capacity
+            self.sent_at[idx] = np.asarray(sent_at, dtype=float)[held - first:end - first]
+
+    def fill_readings(self, first, measurement):
+        """Attach captured voltages to the played points logged since `first`.
+
+        Readings map in order onto played points, as in RunLogger; points
+        already overwritten are skipped over by their played ordinal.
+        """
+        held = max(first, self._count - self.capacity)
+        idx = np.arange(held, self._count) % self.capacity
+        idx = idx[self.kind[idx] == PLAYED]
+        if not idx.size:
+            return
+        base = self.played[idx[0]] if held == first else self._played_at_start
+        k = self.played[idx] - base
+        ok = k < len(measurement)
+        self.voltage[idx[ok]] = measurement.voltage[k[ok]]
+
+    def window(self, seconds=LIVE_WINDOW, now=None):
+        """(t, setpoint, voltage) of the points applied in the last `seconds`.
+
+        Times are seconds relative to `now` (so <= 0). Played segments are
+        logged at INIT with their future play times; those are left out
+        until they have happened.
+        """
+        now = time.perf_counter() if now is None else now
+        end = self._count
+        start = max(0, end - self.capacity)
+        t, setpoint, voltage = (self._ordered(a, start, end) for a in (self.sent_at, self.setpoint, self.voltage))
+        # Anything the writer overwrote while we were copying is unreliable
+        stale = max(0, self._count - self.capacity - start)
+        t, setpoint, voltage = t[stale:], setpoint[stale:], voltage[stale:]
+        lo = np.searchsorted(t, now - seconds, side="left")
+        hi = np.searchsorted(t, now, side="right")
+        # Keep the last level before the window so the trace starts at its left edge
+        lo = max(lo - 1, 0)
+        return t[lo:hi] - now, setpoint[lo:hi], voltage[lo:hi]
+
+    def _ordered(self, a, start, end):
+        """Copy of points start..end (absolute indices) in append order."""
+        i, j = start % self.capacity, end % self.capacity
+        if end - start < self.capacity and i <= j:
+            return a[i:j].copy()
+        return np.concatenate((a[i:], a[:j]))
+
+
+class LivePlot:
+    """Scrolling view of a LiveBuffer, redrawn by blitting.
+
+    The x axis is fixed to "seconds ago" (-window .. 0), so the axes, ticks
+    and labels never change while data scrolls: each frame restores the
+    cached background and draws only the animated lines. A full redraw
+    happens only when the y range has to grow.
+    """
+
+    def __init__(self, figure, canvas, window=LIVE_WINDOW):
+        self.canvas = canvas
+        self.window = window
+        self.ax = figure.add_subplot(111)
+        self.ax.set_xlabel("Time (s, relative to now)")
+        self.ax.set_ylabel("Voltage (V)")
+        self.ax.set_title("Live Output")
+        self.ax.set_xlim(-window, 0.0)
+        self.ax.set_ylim(-1.0, 1.0)
+        self.setpoint_line, = self.ax.plot([], [], drawstyle="steps-post", animated=True, label="Applied")
+        self.voltage_line, = self.ax.plot([], [], ".", markersize=2, animated=True, label="Measured")
+        self.ax.legend(loc="upper left")
+        self._background = None
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def set_range(self, low, high):
+        """Y range of the coming run (e.g. the waveform's bounds), with a margin."""
+        margin = max(0.05 * (high - low), 0.1)
+        self.ax.set_ylim(low - margin, high + margin)
+        self.canvas.draw_idle()
+
+    def update(self, buffer):
+        t, setpoint, voltage = buffer.window(self.window)
+        if t.size:
+            # Extend the held level to "now"
+            t = np.append(t, 0.0)
+            setpoint = np.append(setpoint, setpoint[-1])
+            voltage = np.append(voltage, np.nan)
+        pixels = self.ax.bbox.width
+        if t.size > 2 * pixels:
+            # More points than pixels: draw the per-pixel min/max envelope instead
+            lod = (-self.window, 0.0, pixels)
+            self.setpoint_line.set_data(*SampledLOD(t, setpoint).view(*lod))
+            measured = np.isfinite(voltage)
+            self.voltage_line.set_data(*SampledLOD(t[measured], voltage[measured]).view(*lod))
+        else:
+            self.setpoint_line.set_data(t, setpoint)
+            self.voltage_line.set_data(t, voltage)
+        if t.size and self._grow_y(setpoint, voltage):
+            self.canvas.draw_idle()
+            return
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def _grow_y(self, *series):
+        low = min(np.nanmin(s) if np.isfinite(s).any() else np.inf for s in series)
+        high = max(np.nanmax(s) if np.isfinite(s).any() else -np.inf for s in series)
+        y0, y1 = self.ax.get_ylim()
+        if low >= y0 and high <= y1:
+            return False
+        self.set_range(min(low, y0), max(high, y1))
+        return True
+
+    def _draw_animated(self):
+        self.ax.draw_artist(self.setpoint_line)
+        self.ax.draw_artist(self.voltage_line)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
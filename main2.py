@@ -1,41 +1,94 @@
+import argparse
+import collections
+import os
 import sys
 import time
+
+from startup import profile   # first, so the startup profile covers every import
+
 import numpy as np
-import pyvisa
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QComboBox,
     QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QHBoxLayout, QMessageBox,
-    QGridLayout
+    QGridLayout, QCheckBox, QProgressBar, QScrollArea
 )
-from PyQt5.QtCore import pyqtSignal, QTimer
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
+
+from waveform import WaveformParams, execution_samples
+from preview import PreviewPlot, preview_lod
+from lazycanvas import LazyCanvas
+from batching import CommandBatch
+from completion import CompletionWaiter
+from connections import shared_manager
+from compiler import LIST_MAX_POINTS
+from execution import configure_voltage_source, list_upload_time, plan_samples, run_waveform
+from live import LIVE_FRAME_RATE, LIVE_WINDOW, LiveBuffer, LivePlot
+from runlog import new_log_path, run_logger, tee_log
+from sync import SyncStart, measure_skew
+from shadow import ensure
+from statspanel import StatsPanel
+from station import DEFAULT_STATION, StepPlan, StepScheduler, load_station
+from telemetry import TELEMETRY_DIR, SnapshotExporter, telemetry_of
+from worker import InstrumentWorker
 
 
 class KeithleyPanel(QWidget):
     finished = pyqtSignal()   # emitted when a waveform run completes
-    def __init__(self, resource_str, title, panel_name):
+    step_finished = pyqtSignal(str, bool)   # (step id, ok) for steps started by run_step
+    connection_settled = pyqtSignal(bool)   # connected (True) or fell back to demo mode
+    connection_done = pyqtSignal(object)    # the connect Future, from the opening thread
+    live_preview_rate = 10    # max live-preview redraws per second
+
+    def __init__(self, resource_str, title, panel_name, connections=None):
         super().__init__()
         self.simulation_mode = False
         self.resource_str = resource_str
         self.panel_name = panel_name
 
-        self.rm = pyvisa.ResourceManager()
+        self.instrument = None
+        self.worker = None           # InstrumentWorker, once connected
+        self.connecting = True
+        self.last_measurement = None   # capture.Measurement of the latest captured run
+        self.last_result = None        # execution.RunResult of the latest run
+        self.current_step = None       # station.Step being run for a step plan
+        self.init_ui()
+        self.setWindowTitle(title)
+        self.set_instrument_controls_enabled(False)
+
+        # Open the instrument in the background; the panel is usable meanwhile
+        self.connection_done.connect(self.on_connection_done, Qt.QueuedConnection)
+        connections = connections or shared_manager()
+        connections.connect(resource_str).add_done_callback(self.connection_done.emit)
+
+    def set_instrument_controls_enabled(self, enabled):
+        for button in (self.run_button, self.steady_button, self.pulse_button, self.resync_button,
+                       self.stats_button):
+            button.setEnabled(enabled)
+
+    def on_connection_done(self, future):
+        self.connecting = False
+        profile.once("first instrument connection settled")
         try:
-            self.instrument = self.rm.open_resource(resource_str)
-            self.instrument.baud_rate = 9600
-            self.instrument.write_termination = '\n'
-            self.instrument.read_termination = '\n'
-            self.instrument.timeout = 10000
-            self.simulation_mode = False
+            connection = future.result()
         except Exception as e:
-            QMessageBox.warning(self, "Simulation Mode", f"Keithley not connected. Running in demo mode.\n\n{e}")
-            self.instrument = None
             self.simulation_mode = True
-
-        self.init_ui()
-        self.setWindowTitle(title)
+            self.connection_label.setText(f"Demo mode — not connected: {e}")
+            self.connection_label.setStyleSheet("color: #b00;")
+        else:
+            self.instrument = connection.instrument
+            self.connection_label.setText(f"Connected: {connection.model}")
+            self.connection_label.setStyleSheet("color: #070;")
+            # All instrument I/O runs on this thread so the window stays responsive
+            self.worker = InstrumentWorker(self.instrument, self)
+            self.worker.job_started.connect(self.on_job_started)
+            self.worker.job_finished.connect(self.on_job_finished)
+            self.worker.job_failed.connect(self.on_job_failed)
+            self.worker.job_result.connect(self.on_job_result)
+            self.worker.progress.connect(self.on_progress)
+            self.worker.start()
+        self.set_instrument_controls_enabled(True)
+        self.connection_settled.emit(not self.simulation_mode)
 
     def init_ui(self):
         self.layout = QVBoxLayout(self)
@@ -43,6 +96,8 @@ class KeithleyPanel(QWidget):
         port_label = QLabel(f"{self.panel_name} — Port: {self.resource_str}")
         port_label.setStyleSheet("font-weight: bold;")
         self.layout.addWidget(port_label)
+        self.connection_label = QLabel("Connecting...")
+        self.layout.addWidget(self.connection_label)
         # Waveform selection
         self.waveform_combo = QComboBox()
         self.waveform_combo.addItems(["Sine", "Cosine", "Square", "Sawtooth", "Custom"])
@@ -119,6 +174,12 @@ class KeithleyPanel(QWidget):
         self.steady_voltage_input.setText("0.0")
         steady_layout.addWidget(self.steady_voltage_input)
 
+        error_layout = QVBoxLayout()
+        error_layout.addWidget(QLabel("Max Error (V)"))
+        self.max_error_input = QLineEdit()
+        self.max_error_input.setText("0.002")
+        error_layout.addWidget(self.max_error_input)
+
         # row 0
         self.input_grid.addLayout(offset_layout, 0, 0)
         self.input_grid.addLayout(amp_layout,    0, 1)
@@ -129,6 +190,7 @@ class KeithleyPanel(QWidget):
         self.input_grid.addLayout(res_layout,     1, 0)
         self.input_grid.addLayout(repeat_layout,  1, 1)
         self.input_grid.addLayout(steady_layout,  1, 2)
+        self.input_grid.addLayout(error_layout,   1, 3)
 
         self.total_time_label = QLabel("Total Duration: N/A")
         self.layout.addLayout(self.input_grid)
@@ -144,32 +206,102 @@ class KeithleyPanel(QWidget):
         self.preview_button = QPushButton("Preview")
         self.run_button = QPushButton("Run on Keithley")
         self.button_layout.addWidget(self.preview_button)
+        self.live_preview_checkbox = QCheckBox("Live Preview")
+        self.button_layout.addWidget(self.live_preview_checkbox)
         self.button_layout.addWidget(self.run_button)
         self.pause_button = QPushButton("Pause")
         self.stop_button = QPushButton("Stop")
         self.button_layout.addWidget(self.pause_button)
         self.button_layout.addWidget(self.stop_button)
+        self.list_mode_checkbox = QCheckBox("List Mode")
+        self.list_mode_checkbox.setToolTip("Upload the waveform to the 2400 source memory instead of streaming each point")
+        self.list_mode_checkbox.setChecked(True)
+        self.button_layout.addWidget(self.list_mode_checkbox)
+        self.sweep_checkbox = QCheckBox("Native Sweeps")
+        self.sweep_checkbox.setToolTip("In list mode, play linear ramps as 2400 sweeps and flat runs as fixed-level holds")
+        self.sweep_checkbox.setChecked(True)
+        self.button_layout.addWidget(self.sweep_checkbox)
+        self.adaptive_checkbox = QCheckBox("Adaptive Sampling")
+        self.adaptive_checkbox.setToolTip("Sample at the transport's achievable rate and simplify within Max Error")
+        self.adaptive_checkbox.setChecked(True)
+        self.button_layout.addWidget(self.adaptive_checkbox)
+        self.capture_checkbox = QCheckBox("Capture I-V")
+        self.capture_checkbox.setToolTip("Measure every instrument-played point into the trace buffer and read it back after the run")
+        self.button_layout.addWidget(self.capture_checkbox)
+        self.log_checkbox = QCheckBox("Log to Disk")
+        self.log_checkbox.setToolTip("Record every setpoint, its send time and any readings to run_logs/")
+        self.button_layout.addWidget(self.log_checkbox)
+        self.pipeline_checkbox = QCheckBox("Pipelined Writes")
+        self.pipeline_checkbox.setToolTip("Streaming: prepare the next setpoint while the current one is being sent")
+        self.button_layout.addWidget(self.pipeline_checkbox)
+        self.live_checkbox = QCheckBox("Live View")
+        self.live_checkbox.setToolTip(f"Plot the applied setpoints of the last {LIVE_WINDOW:g} s while a waveform runs")
+        self.live_checkbox.setChecked(True)
+        self.button_layout.addWidget(self.live_checkbox)
+        self.late_policy_combo = QComboBox()
+        self.late_policy_combo.addItems(["Stretch", "Skip"])
+        self.late_policy_combo.setToolTip("Streaming: what to do with samples that miss their deadline")
+        self.button_layout.addWidget(self.late_policy_combo)
 
         self.steady_button = QPushButton("Apply Steady Voltage")
         self.pulse_button = QPushButton("Apply Pulse")
         self.button_layout.addWidget(self.steady_button)
         self.button_layout.addWidget(self.pulse_button)
-        self.steady_button.clicked.connect(self.apply_steady_voltage)
+        self.resync_button = QPushButton("Resync")
+        self.resync_button.setToolTip("Forget the cached instrument settings; the next run resets and reconfigures")
+        self.button_layout.addWidget(self.resync_button)
+        self.stats_button = QPushButton("Stats")
+        self.stats_button.setToolTip("Command latencies, late samples, timeouts and recent events")
+        self.button_layout.addWidget(self.stats_button)
+        self.stats_panel = None
+        self.steady_button.clicked.connect(lambda: self.apply_steady_voltage())
         self.pulse_button.clicked.connect(self.apply_pulse_waveform)
+        self.resync_button.clicked.connect(self.resync_instrument)
+        self.stats_button.clicked.connect(self.show_stats)
 
         self.layout.addLayout(self.button_layout)
         self.layout.addWidget(self.total_time_label)
+        self.progress_bar = QProgressBar()
+        self.layout.addWidget(self.progress_bar)
+        self.sampling_label = QLabel("Execution: N/A")
+        self.layout.addWidget(self.sampling_label)
+        self.timing_label = QLabel("Timing: N/A")
+        self.layout.addWidget(self.timing_label)
 
         self.preview_button.clicked.connect(self.plot_waveform)
-        self.run_button.clicked.connect(self.send_waveform_to_keithley)
+        self.run_button.clicked.connect(lambda: self.send_waveform_to_keithley())
         self.pause_button.clicked.connect(self.pause_waveform)
         self.stop_button.clicked.connect(self.stop_waveform)
 
-        from PyQt5.QtWidgets import QScrollArea
-        self.figure = Figure(figsize=(6, 5))
-        self.canvas = FigureCanvas(self.figure)
-        self.scroll_area = QScrollArea()
-        self.layout.addWidget(self.canvas)
+        # matplotlib is only loaded when the first preview is drawn
+        self.plot_area = LazyCanvas("Press Preview to plot the waveform")
+        self.layout.addWidget(self.plot_area)
+        self.preview = None   # PreviewPlot, created together with the canvas
+
+        # Live view of a running waveform: the run loop fills a ring buffer,
+        # a timer redraws it at most LIVE_FRAME_RATE times per second
+        self.live_area = LazyCanvas("Live output", figsize=(6, 3))
+        self.live_area.setVisible(False)
+        self.layout.addWidget(self.live_area)
+        self.live_buffer = None   # LiveBuffer, allocated on the first live run
+        self.live_plot = None
+        self._live_runs = collections.deque()   # per submitted, unfinished run: does it feed the live view
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(int(1000 / LIVE_FRAME_RATE))
+        self.live_timer.timeout.connect(self.update_live_view)
+
+        # Live preview: parameter edits redraw through a throttling single-shot timer
+        self.live_preview_timer = QTimer(self)
+        self.live_preview_timer.setSingleShot(True)
+        self.live_preview_timer.setInterval(int(1000 / self.live_preview_rate))
+        self.live_preview_timer.timeout.connect(self.live_preview_update)
+        for field in (self.amplitude_input, self.freq_input, self.phase_input, self.offset_input,
+                      self.repeat_input, self.square_duty_input):
+            field.textChanged.connect(self.schedule_live_preview)
+        self.waveform_combo.currentTextChanged.connect(self.schedule_live_preview)
+        self.square_start_high.currentTextChanged.connect(self.schedule_live_preview)
+        self.pulse_table.itemChanged.connect(self.schedule_live_preview)
+        self.steady_voltage_input.textChanged.connect(self.live_update_steady)
 
     def update_waveform_visibility(self, waveform_name):
         if waveform_name == "Square":
@@ -177,30 +309,34 @@ class KeithleyPanel(QWidget):
         else:
             self.square_settings_layout_widget.hide()
 
-    def generate_waveform(self):
-        waveform = self.waveform_combo.currentText()
-        amp = float(self.amplitude_input.text() or 0)
-        freq = float(self.freq_input.text() or 1)
-        phase = float(self.phase_input.text() or 0)
-        total_time = 1.0 / freq
-        t = np.arange(0, total_time, 0.01)
-
-        if waveform == "Sine":
-            v = amp * np.sin(2 * np.pi * freq * t + np.deg2rad(phase))
-        elif waveform == "Cosine":
-            v = amp * np.cos(2 * np.pi * freq * t + np.deg2rad(phase))
-        elif waveform == "Square":
-            duty = float(self.square_duty_input.text() or 50) / 100.0
-            start_high = self.square_start_high.currentText() == "High"
-            period = 1.0 / freq
-            v = np.zeros_like(t)
-            high_time = duty * period
-            for i, ti in enumerate(t):
-                cycle_pos = (ti + (0 if start_high else high_time)) % period
-                v[i] = amp if cycle_pos < high_time else -amp
-        elif waveform == "Sawtooth":
-            v = amp * 2 * (t * freq - np.floor(0.5 + t * freq))
-        elif waveform == "Custom":
+    def waveform_params(self):
+        """Read the input widgets into a WaveformParams."""
+        params = WaveformParams(
+            waveform=self.waveform_combo.currentText(),
+            amplitude=float(self.amplitude_input.text() or 0),
+            frequency=float(self.freq_input.text() or 1),
+            phase=float(self.phase_input.text() or 0),
+            offset=float(self.offset_input.text() or 0),
+            start_high=self.square_start_high.currentText() == "High",
+        )
+        try:
+            params.duty = float(self.square_duty_input.text() or 50) / 100.0
+        except:
+            params.duty = 0.5
+        try:
+            params.resolution = float(self.interval_input.text() or 0.001)
+        except:
+            params.resolution = 0.001
+        try:
+            params.repeat_count = int(self.repeat_input.text() or 1)
+        except:
+            params.repeat_count = 1
+        try:
+            params.steady_voltage = float(self.steady_voltage_input.text() or 0.0)
+        except:
+            params.steady_voltage = 0.0
+
+        if params.waveform == "Custom":
             t = []
             v = []
             for row in range(self.pulse_table.rowCount()):
@@ -211,286 +347,497 @@ class KeithleyPanel(QWidget):
                     v.append(v_val)
                 except:
                     continue
-            t = np.array(t)
-            v = np.array(v)
-        offset = float(self.offset_input.text() or 0)
-        v += offset
-        return t, v
+            params.custom_times = np.array(t)
+            params.custom_voltages = np.array(v)
+        return params
 
-    def plot_waveform(self):
-        t, v = self.generate_waveform()
-        try:
-            freq = float(self.freq_input.text() or 1.0)
-            repeat_count = int(self.repeat_input.text() or 1)
-            single_cycle_time = 1.0 / freq
-        except:
-            freq = 1.0
-            repeat_count = 1
-            single_cycle_time = 1.0
-
-        total_time = (1.0 / freq) * repeat_count
-        t_full = np.linspace(0, total_time, 1000 * repeat_count)
-
-        waveform_type = self.waveform_combo.currentText()
-        amp = float(self.amplitude_input.text() or 0)
-        phase = float(self.phase_input.text() or 0)
-
-        if waveform_type == "Sine":
-            v_full = amp * np.sin(2 * np.pi * freq * t_full + np.deg2rad(phase))
-        elif waveform_type == "Cosine":
-            v_full = amp * np.cos(2 * np.pi * freq * t_full + np.deg2rad(phase))
-        elif waveform_type == "Square":
+    def generate_waveform(self):
+        return execution_samples(self.waveform_params())
+
+    def run_samples(self, params, list_mode, legacy_interval=None):
+        """Voltages to run and the interval between them; shows the plan in the UI.
+
+        With adaptive sampling the grid follows the transport's achievable
+        rate and is simplified within Max Error; otherwise the fixed 10 ms
+        samples are played at `legacy_interval` (or spread over one period).
+        """
+        if self.adaptive_checkbox.isChecked():
             try:
-                duty = float(self.square_duty_input.text() or 50) / 100.0
+                max_error = float(self.max_error_input.text() or 0.002)
             except:
-                duty = 0.5
-            start_high = self.square_start_high.currentText() == "High"
-            period = 1.0 / freq
-            v_full = np.zeros_like(t_full)
-            high_time = duty * period
-            for i, ti in enumerate(t_full):
-                cycle_pos = (ti + (0 if start_high else high_time)) % period
-                v_full[i] = amp if cycle_pos < high_time else -amp
-        elif waveform_type == "Sawtooth":
-            v_full = amp * 2 * (t_full * freq - np.floor(0.5 + t_full * freq))
-        elif waveform_type == "Custom":
-            t_full = t
-            v_full = v
-        offset = float(self.offset_input.text() or 0)
-        v_full += offset
-
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        ax.plot(t_full, v_full)
-        ax.set_xlabel("Time (s)")
-        ax.set_ylabel("Voltage (V)")
-        ax.set_title("Waveform Preview")
-        ax.set_xlim(t_full[0], t_full[-1])  # Zoomable area
-        ax.set_autoscaley_on(True)
-        try:
-            steady_voltage = float(self.steady_voltage_input.text() or 0.0)
-            ax.axhline(y=steady_voltage, color='red', linestyle='--', label=f"Steady Voltage ({steady_voltage:.2f} V)")
-        except:
-            pass
-        ax.legend()
+                max_error = 0.002
+            samples = plan_samples(params, self.resource_str, list_mode, max_error)
+            self.sampling_label.setText(f"Execution: {samples.summary(params.repeat_count)}")
+            return samples.v, samples.interval
+
+        _, voltages = execution_samples(params)
+        interval = legacy_interval or params.period / max(len(voltages), 1)
+        expected = len(voltages) * interval * params.repeat_count
+        if list_mode:
+            uploads = 1 if len(voltages) <= LIST_MAX_POINTS else params.repeat_count
+            expected += list_upload_time(self.resource_str, len(voltages)) * uploads
+        self.sampling_label.setText(f"Execution: {len(voltages)} samples @ {interval * 1e3:.2f} ms, expected {expected:.2f} s")
+        return voltages, interval
+
+    def plot_waveform(self):
+        params = self.waveform_params()
+        if self.preview is None:
+            self.preview = PreviewPlot(*self.plot_area.ensure())
+        self.preview.show(preview_lod(params), params.steady_voltage)
+        self.plot_area.toolbar.update()  # new home view for zoom/pan
+        self.total_time_label.setText(f"Total Duration: {params.total_duration:.2f} s")
+        self.run_samples(params, self.list_mode_checkbox.isChecked())
+
+    def schedule_live_preview(self, *args):
+        """Coalesce edits so live preview redraws at most live_preview_rate times per second."""
+        if self.live_preview_checkbox.isChecked() and not self.live_preview_timer.isActive():
+            self.live_preview_timer.start()
+
+    def live_preview_update(self):
         try:
-            total_duration = (1.0 / freq) * repeat_count
-        except:
-            total_duration = 0.0
-        self.total_time_label.setText(f"Total Duration: {total_duration:.2f} s")
-        self.canvas.draw()
+            self.plot_waveform()
+        except (ValueError, ZeroDivisionError):
+            pass  # field is mid-edit
 
-    def send_waveform_to_keithley(self):
-        self.triggered = False
-        self.paused = False
-        self.stopped = False
+    def live_update_steady(self, text):
+        if not self.live_preview_checkbox.isChecked() or self.preview is None:
+            return
+        try:
+            self.preview.set_steady(float(text or 0.0))
+        except ValueError:
+            pass
 
-        _, voltages = self.generate_waveform()
+    def check_samples(self, voltages):
+        """Warn and return False when there is nothing to run (an empty custom table)."""
+        if len(voltages):
+            return True
+        QMessageBox.warning(self, "Empty Waveform", "The waveform has no samples. Add points to the custom table first.")
+        return False
 
-        try:
-            resolution = float(self.interval_input.text() or 0.001)
-        except:
-            resolution = 0.001
+    def send_waveform_to_keithley(self, sync=None):
+        """Run the waveform; with `sync` (a SyncStart) it starts on the shared time base.
 
-        try:
-            repeat_count = int(self.repeat_input.text() or 1)
-        except:
-            repeat_count = 1
+        Returns False when nothing was started (an empty waveform).
+        """
+        self.triggered = False
 
-        try:
-            freq = float(self.freq_input.text() or 1.0)
-            total_duration = (1.0 / freq) * repeat_count
-        except:
-            total_duration = 0.0
+        params = self.waveform_params()
+        list_mode = self.list_mode_checkbox.isChecked()
+        voltages, interval = self.run_samples(params, list_mode, legacy_interval=0.02)
+        if not self.check_samples(voltages):
+            return False
+        resolution = params.resolution
+        repeat_count = params.repeat_count
+        total_duration = params.total_duration
         self.total_time_label.setText(f"Total Duration: {total_duration:.2f} s")
 
         if self.simulation_mode:
             QMessageBox.information(self, "Simulation", f"Simulated sending of waveform\nDuration: {total_duration:.2f}s")
             self.finished.emit()
-            return
+            return True
 
-        try:
-            self.instrument.write("*RST")  # 초기화
-            self.instrument.write("*CLS")
-            self.instrument.write("SOUR:FUNC VOLT")
-            self.instrument.write("SOUR:VOLT:RANG 20")  # Adjust voltage range as needed
-            self.instrument.write("SOUR:VOLT:MODE FIXED")
-            self.instrument.write("SENS:CURR:PROT 0.1")
-            self.instrument.write("OUTP ON")
-            time.sleep(0.1)  # Wait for the instrument to stabilize
+        sweeps = self.sweep_checkbox.isChecked()
+        capture = self.capture_checkbox.isChecked()
+        pipeline = self.pipeline_checkbox.isChecked()
+        log_path = new_log_path(self.panel_name) if self.log_checkbox.isChecked() else None
+        policy = self.late_policy_combo.currentText().lower()
+        live = self.start_live_view(voltages)
 
+        def job(instrument, control):
             try:
-                status = self.instrument.query("OUTP?")
+                configure_voltage_source(instrument)
+                if ensure(instrument, "OUTP", "ON"):
+                    time.sleep(0.1)  # Wait for the instrument to stabilize
+            except Exception:
+                if sync is not None:
+                    sync.abort()   # release the other instruments
+                raise
+
+            try:
+                status = instrument.query("OUTP?")
                 print("Output status:", status)
             except Exception as e:
                 print("Warning: Failed to read output status. Proceeding anyway.")
 
-            # Debug print for interval and repeat info
-            print(f"Interval: 0.02 s, Repeats: {repeat_count}, Total samples: {len(voltages)}")
-
-            self.instrument.write("TRIG:SOUR BUS")
-            self.instrument.write("TRIG:COUN 1")
-            self.instrument.write("INIT")
-            # Removed QMessageBox with "Trigger Ready"
-
-            for _ in range(repeat_count):
-                for v in voltages:
-                    if self.stopped:
-                        break
-                    while self.paused:
-                        QApplication.processEvents()
-                        time.sleep(0.05)
-                    if self.stopped:
-                        break
-                    v = round(v / resolution) * resolution
-                    # Debug print for each voltage value
-                    print(f"Sending voltage: {v:.4f}")
-                    self.instrument.write(f"SOUR:VOLT {v:.4f}")
-                    time.sleep(0.02)
-
-            self.instrument.write("OUTP OFF")
-
-            # Wait until all buffered commands are processed to avoid 102 errors
+            start_at = sync.wait() if sync is not None else None
+            if live is not None:
+                live.reset()
+            with run_logger(log_path, interval) as log:
+                result = run_waveform(instrument, voltages, interval, repeat_count, resolution, control,
+                                      list_mode=list_mode, sweeps=sweeps, policy=policy, capture=capture,
+                                      arm_bus_trigger=True, echo=True, log=tee_log(log, live), pipeline=pipeline,
+                                      start_at=start_at)
+            # Finish only once the instrument has processed everything (avoids 102 errors);
+            # signalled by SRQ on GPIB, by status-byte polling on serial
+            waiter = CompletionWaiter(instrument)
+            with CommandBatch(instrument) as batch:
+                waiter.start(batch, "OUTP OFF")
             try:
-                self.instrument.query("*OPC?")   # blocks until SMU reports “operation complete”
+                waiter.wait(0.0)
             except Exception:
-                pass   # ignore if query fails; safety delay is still achieved
-
-            self.finished.emit()
-        except Exception as e:
-            QMessageBox.critical(self, "Communication Error", str(e))
-            self.finished.emit()
+                pass   # a lost status reply shouldn't fail a finished run
+            return result
+
+        self.worker.submit("waveform", job, "Communication Error")
+        return True
+
+    def start_live_view(self, voltages):
+        """Show the live view for a run of `voltages`; returns the buffer to fill, or None."""
+        live = self.live_checkbox.isChecked()
+        self._live_runs.append(live)
+        if not live:
+            return None
+        if self.live_plot is None:
+            self.live_area.setVisible(True)
+            self.live_buffer = LiveBuffer()
+            self.live_plot = LivePlot(*self.live_area.ensure())
+        if len(voltages):
+            self.live_plot.set_range(float(np.min(voltages)), float(np.max(voltages)))
+        return self.live_buffer
+
+    def update_live_view(self):
+        self.live_plot.update(self.live_buffer)
+
+    def stop_live_view(self):
+        """The oldest submitted run ended; the next one restarts the view when it starts."""
+        if self._live_runs:
+            self._live_runs.popleft()
+        if self.live_timer.isActive():
+            self.live_timer.stop()
+            self.update_live_view()   # the final state of the run
 
     def pause_waveform(self):
-        self.paused = not self.paused
-        if self.paused:
-            self.pause_button.setText("Resume")
-        else:
+        if self.worker is None:
+            return
+        if self.worker.control.paused:
+            self.worker.resume()
             self.pause_button.setText("Pause")
+        else:
+            self.worker.pause()
+            self.pause_button.setText("Resume")
 
     def stop_waveform(self):
-        self.stopped = True
+        if self.worker is not None:
+            self.worker.stop()
+            # Queued runs were dropped; only the running one will still finish
+            while len(self._live_runs) > 1:
+                self._live_runs.pop()
+
+    def on_job_started(self, name):
+        if name in ("waveform", "pulse") and self._live_runs and self._live_runs[0]:
+            self.live_timer.start()
+        self.pause_button.setText("Pause")
+        self.progress_bar.setValue(0)
+
+    def on_job_finished(self, name, ok):
+        if name in ("waveform", "pulse"):
+            self.stop_live_view()
+        step = self.current_step
+        if step is not None and name == step.action:
+            self.current_step = None
+            if name == "waveform":
+                self.finished.emit()
+            # A stopped run doesn't satisfy the steps waiting on it
+            self.step_finished.emit(step.id, ok and not self.worker.control.stopped)
+        elif name == "steady" and ok:
+            QMessageBox.information(self, "Steady Voltage", f"Steady voltage {self._steady_v:.2f} V applied.")
+        elif name == "waveform":
+            self.finished.emit()
+
+    def on_job_result(self, name, result):
+        self.last_result = result
+        self.timing_label.setText(f"Timing: {result.summary()}")
+        if result.measurement is not None:
+            self.last_measurement = result.measurement
 
-    def apply_steady_voltage(self):
+    def on_job_failed(self, title, message):
+        QMessageBox.critical(self, title, message)
+
+    def on_progress(self, done, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def apply_steady_voltage(self, steady_v=None):
+        """Hold `steady_v` (default: the Steady Voltage field); returns False when nothing was started."""
         if self.simulation_mode:
             QMessageBox.information(self, "Simulation", "Applying steady voltage (simulated).")
-            return
-        try:
-            steady_v = float(self.steady_voltage_input.text() or 0.0)
-            self.instrument.write("*RST")
-            self.instrument.write("*CLS")
-            self.instrument.write("SOUR:FUNC VOLT")
-            self.instrument.write("SOUR:VOLT:RANG 20")
-            self.instrument.write("SOUR:VOLT:MODE FIXED")
-            self.instrument.write("SENS:CURR:PROT 0.1")
-            self.instrument.write(f"SOUR:VOLT {steady_v:.4f}")
-            self.instrument.write("OUTP ON")
-            QMessageBox.information(self, "Steady Voltage", f"Steady voltage {steady_v:.2f} V applied.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+            return True
+        if steady_v is None:
+            try:
+                steady_v = float(self.steady_voltage_input.text() or 0.0)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", str(e))
+                return False
+        self._steady_v = steady_v
 
-    def apply_pulse_waveform(self):
-        if self.simulation_mode:
-            QMessageBox.information(self, "Simulation", "Sending pulse waveform (simulated).")
-            return
+        def job(instrument, control):
+            configure_voltage_source(instrument)
+            instrument.write(f"SOUR:VOLT {steady_v:.4f}")
+            ensure(instrument, "OUTP", "ON")
 
-        self.paused = False
-        self.stopped = False
+        self.worker.submit("steady", job, "Error")
+        return True
 
-        _, voltages = self.generate_waveform()
+    def resync_instrument(self):
+        if self.worker is None:
+            return
 
-        try:
-            resolution = float(self.interval_input.text() or 0.001)
-            repeat_count = int(self.repeat_input.text() or 1)
-            freq = float(self.freq_input.text() or 1.0)
-        except:
-            resolution = 0.001
-            repeat_count = 1
-            freq = 1.0
+        def job(instrument, control):
+            instrument.resync()
 
-        interval = 1.0 / (freq * len(voltages))
+        # Queued behind any running job so it can't race the current run
+        self.worker.submit("resync", job, "Error")
 
+    def show_stats(self):
+        telemetry = telemetry_of(self.instrument)
+        if telemetry is None:
+            QMessageBox.information(self, "Stats", "No instrument connected (demo mode).")
+            return
+        if self.stats_panel is None:
+            self.stats_panel = StatsPanel(telemetry)
+        self.stats_panel.show()
+        self.stats_panel.raise_()
+
+    def apply_pulse_waveform(self):
+        """Run one pulse of the waveform; returns False when nothing was started."""
+        if self.simulation_mode:
+            QMessageBox.information(self, "Simulation", "Sending pulse waveform (simulated).")
+            return True
+
+        params = self.waveform_params()
+        list_mode = self.list_mode_checkbox.isChecked()
+        voltages, interval = self.run_samples(params, list_mode)
+        if not self.check_samples(voltages):
+            return False
+        resolution = params.resolution
+        repeat_count = params.repeat_count
+
+        sweeps = self.sweep_checkbox.isChecked()
+        capture = self.capture_checkbox.isChecked()
+        pipeline = self.pipeline_checkbox.isChecked()
+        log_path = new_log_path(self.panel_name) if self.log_checkbox.isChecked() else None
+        policy = self.late_policy_combo.currentText().lower()
+        live = self.start_live_view(voltages)
+
+        def job(instrument, control):
+            if live is not None:
+                live.reset()
+            with run_logger(log_path, interval) as log:
+                return run_waveform(instrument, voltages, interval, repeat_count, resolution, control,
+                                    list_mode=list_mode, sweeps=sweeps, policy=policy, capture=capture,
+                                    log=tee_log(log, live), pipeline=pipeline)
+
+        self.worker.submit("pulse", job, "Error during pulse")
+        return True
+
+    def run_step(self, step):
+        """Start a station.Step on this instrument; `step_finished` reports its end."""
+        if self.simulation_mode:
+            # Nothing to wait for; report once the caller's dispatch loop is done
+            QTimer.singleShot(0, lambda: self.step_finished.emit(step.id, True))
+            return
+        self.current_step = step
         try:
-            for _ in range(repeat_count):
-                for v in voltages:
-                    if self.stopped:
-                        break
-                    while self.paused:
-                        QApplication.processEvents()
-                        time.sleep(0.05)
-                    if self.stopped:
-                        break
-                    v = round(v / resolution) * resolution
-                    self.instrument.write(f"SOUR:VOLT {v:.4f}")
-                    time.sleep(interval)
+            if step.action == "waveform":
+                started = self.send_waveform_to_keithley()
+            elif step.action == "pulse":
+                started = self.apply_pulse_waveform()
+            else:
+                # The step's own voltage, if any; the panel's field is left as the user set it
+                started = self.apply_steady_voltage(step.voltage)
         except Exception as e:
-            QMessageBox.critical(self, "Error during pulse", str(e))
+            QMessageBox.critical(self, "Step Error", f"Step {step.id}: {e}")
+            started = False
+        if not started:
+            # Never submitted (e.g. a bad field or an empty waveform): fail the step so the plan goes on
+            self.current_step = None
+            QTimer.singleShot(0, lambda: self.step_finished.emit(step.id, False))
+
+    def shutdown(self):
+        if self.worker is not None:
+            self.worker.shutdown()
+        if self.stats_panel is not None:
+            self.stats_panel.close()
 # Add after KeithleyPanel class, before if __name__ == "__main__":
 
-class DualKeithleyApp(QMainWindow):
-    def __init__(self):
+class StationApp(QMainWindow):
+    """One KeithleyPanel per instrument of a station, plus a step plan runner."""
+
+    max_columns = 4
+
+    def __init__(self, station=DEFAULT_STATION):
         super().__init__()
-        self.setWindowTitle("Dual Keithley 2400 Waveform Generator")
+        self.station = station
+        self.setWindowTitle(f"Keithley 2400 Waveform Generator — {len(station.instruments)} instruments")
 
         # Central widget and main vertical layout
         central = QWidget()
         self.setCentralWidget(central)
         main_v_layout = QVBoxLayout(central)
-        h_layout = QHBoxLayout()
-        main_v_layout.addLayout(h_layout)
-
-        # Left panel — GPIB communication
-        self.gpib_panel = KeithleyPanel("GPIB0::24::INSTR", "GPIB — Keithley 2400", "Panel 1")
-        h_layout.addWidget(self.gpib_panel)
-
-        # Right panel — Serial (ASRL4) communication
-        self.serial_panel = KeithleyPanel("ASRL4::INSTR", "Serial — Keithley 2400", "Panel 2")
-        h_layout.addWidget(self.serial_panel)
-
-        # If both instruments are not connected, switch the whole app to demo mode
-        if self.gpib_panel.simulation_mode and self.serial_panel.simulation_mode:
-            QMessageBox.information(
-                self,
-                "Demo Mode",
-                "두 Keithley 2400 장치 모두 연결되지 않았습니다.\n데모 모드로 전환합니다.",
-            )
-            self.demo_mode = True
-        else:
-            self.demo_mode = False
+        grid_host = QWidget()
+        grid = QGridLayout(grid_host)
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(grid_host)
+        main_v_layout.addWidget(scroll)
+
+        # One panel per instrument, filled row by row; all of them connect
+        # concurrently in the background through one ConnectionManager
+        columns = min(len(station.instruments), self.max_columns)
+        self.connections = shared_manager()
+        self.panels = {}
+        self.demo_mode = False
+        self._connecting = len(station.instruments)
+        for i, spec in enumerate(station.instruments):
+            panel = KeithleyPanel(spec.resource, spec.title, spec.name, self.connections)
+            panel.step_finished.connect(self.on_step_finished)
+            panel.connection_settled.connect(self.on_connection_settled)
+            grid.addWidget(panel, i // columns, i % columns)
+            self.panels[spec.name] = panel
 
         # --- sequence controls ---
+        names = list(self.panels)
+        numbers = [str(i + 1) for i in range(len(names))]
+        self.modes = [
+            (" → ".join(numbers) + "  (in order)", lambda: self.run_plan(StepPlan.chain(names))),
+            (" → ".join(reversed(numbers)) + "  (reverse order)",
+             lambda: self.run_plan(StepPlan.chain(names[::-1]))),
+            (" + ".join(numbers) + "  (Parallel, synchronized)", self.run_parallel),
+        ]
+        if station.plan is not None:
+            self.modes.append((f"Step plan ({len(station.plan)} steps)", lambda: self.run_plan(station.plan)))
+
         seq_layout = QHBoxLayout()
         seq_layout.addWidget(QLabel("Sequence Mode:"))
         self.mode_combo = QComboBox()
-        self.mode_combo.addItems(["1 → 2  (Panel 1 first)", "2 → 1  (Panel 2 first)"])
+        self.mode_combo.addItems([label for label, _ in self.modes])
         seq_layout.addWidget(self.mode_combo)
         self.seq_run_btn = QPushButton("Run Sequence")
         seq_layout.addWidget(self.seq_run_btn)
+        self.status_label = QLabel("Skew: -")
+        seq_layout.addWidget(self.status_label)
         main_v_layout.addLayout(seq_layout)
 
+        self.scheduler = None   # station.StepScheduler of the running plan
         self.seq_run_btn.clicked.connect(self.run_sequence)
+        self.seq_run_btn.setEnabled(self._connecting == 0)
 
-    def run_sequence(self):
-        """Run the two panels strictly sequentially using the `finished` signal."""
-        order = self.mode_combo.currentIndex()
-        if order == 0:
-            first, second = self.gpib_panel, self.serial_panel
-        else:
-            first, second = self.serial_panel, self.gpib_panel
+        # Telemetry of every connected instrument on disk, refreshed every few seconds
+        self.snapshots = SnapshotExporter(os.path.join(TELEMETRY_DIR, "station.json"), self.telemetry_sources).start()
 
-        # Define a slot that starts the second panel once the first is done
-        def start_second():
-            first.finished.disconnect(start_second)   # prevent multiple triggers
-            # 120 ms delay gives the first instrument time to clear any buffers
-            QTimer.singleShot(120, second.send_waveform_to_keithley)
+    def telemetry_sources(self):
+        return [telemetry_of(p.instrument) for p in self.panels.values() if telemetry_of(p.instrument) is not None]
 
-        first.finished.connect(start_second)
-        first.send_waveform_to_keithley()
+    def on_connection_settled(self, connected):
+        self._connecting -= 1
+        if self._connecting:
+            return
+        self.seq_run_btn.setEnabled(True)
+        # If no instrument is connected, switch the whole app to demo mode
+        if all(panel.simulation_mode for panel in self.panels.values()):
+            self.demo_mode = True
+            QMessageBox.information(
+                self,
+                "Demo Mode",
+                "연결된 Keithley 2400 장치가 없습니다.\n데모 모드로 전환합니다.",
+            )
+
+    def run_sequence(self):
+        if self.scheduler is not None:
+            return   # a plan is still running
+        _, run = self.modes[self.mode_combo.currentIndex()]
+        run()
+
+    def run_plan(self, plan):
+        """Run a StepPlan: every step starts as soon as its dependencies are
+        done and its bus is free, so instruments on different buses overlap."""
+        self.scheduler = StepScheduler(plan, self.station.bus_of_step)
+        self.seq_run_btn.setEnabled(False)
+        self.dispatch_steps()
+
+    def dispatch_steps(self):
+        for step in self.scheduler.dispatch():
+            self.panels[step.instrument].run_step(step)
+        self.status_label.setText(f"Steps: {self.scheduler.summary()}")
+        if self.scheduler.finished:
+            self.scheduler = None
+            self.seq_run_btn.setEnabled(True)
+
+    def on_step_finished(self, step_id, ok):
+        if self.scheduler is None or step_id not in self.scheduler.state:
+            return
+        self.scheduler.complete(step_id, ok)
+        self.dispatch_steps()
+
+    def run_parallel(self):
+        """Start all panels on one host time base and report their skew."""
+        panels = [p for p in self.panels.values() if not p.simulation_mode]
+        if len(panels) < 2:
+            # Nothing to synchronize; let the demo panels simulate their runs
+            for panel in self.panels.values():
+                panel.send_waveform_to_keithley()
+            return
+
+        sync = SyncStart(len(panels))
+        slots = {}
+
+        def on_finished(panel):
+            panel.finished.disconnect(slots.pop(panel))   # one report per run
+            if slots:
+                return
+            if sync.t0 is None:
+                self.status_label.setText("Skew: run did not start")
+                return
+            report = measure_skew([p.last_result for p in panels], sync.t0)
+            self.status_label.setText(f"Skew: {report.summary()}")
+
+        self.status_label.setText("Skew: running...")
+        for panel in panels:
+            panel.last_result = None
+            slots[panel] = lambda panel=panel: on_finished(panel)
+            panel.finished.connect(slots[panel])
+        for i, panel in enumerate(panels):
+            try:
+                started = panel.send_waveform_to_keithley(sync=sync)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"{panel.panel_name}: {e}")
+                started = False
+            if not started:
+                # The panels already submitted would wait out the sync timeout for this one
+                sync.abort()
+                for rest in panels[i:]:
+                    rest.finished.disconnect(slots.pop(rest))
+                if not slots:
+                    self.status_label.setText("Skew: run did not start")
+                return
+
+    def closeEvent(self, event):
+        for panel in self.panels.values():
+            panel.shutdown()
+        self.snapshots.stop()
+        self.connections.close_all()
+        super().closeEvent(event)
 
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    win = DualKeithleyApp()
+    parser = argparse.ArgumentParser(description="Keithley 2400 waveform generator for several instruments")
+    parser.add_argument("station", nargs="?", help="station file (JSON) with instruments and steps")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print an import/initialization time breakdown")
+    parser.add_argument("--simulate", action="store_true",
+                        help="use simulated SourceMeters instead of the configured instruments")
+    args, qt_args = parser.parse_known_args()
+    if args.profile_startup:
+        profile.enable()
+    shared_manager().simulate = args.simulate
+    profile.mark("imports")
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    profile.mark("QApplication")
+    station = load_station(args.station) if args.station else DEFAULT_STATION
+    win = StationApp(station)
+    profile.mark("window built")
     win.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    QTimer.singleShot(0, lambda: profile.mark("first window shown"))
+    sys.exit(app.exec_())
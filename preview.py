@@ -0,0 +1,187 @@
+import numpy as np
+
+from waveform import PREVIEW_POINTS_PER_CYCLE, execution_samples, preview_cycle
+
+
+def _sparse_table(a, reduce):
+    """table[k, i] = reduce(a[i:i + 2**k]) for O(1) range queries."""
+    levels = [a]
+    width = 1
+    while width * 2 <= a.size:
+        prev = levels[-1]
+        level = prev.copy()
+        level[:a.size - width] = reduce(prev[:a.size - width], prev[width:])
+        levels.append(level)
+        width *= 2
+    return np.stack(levels)
+
+
+def _range_query(table, reduce, starts, stops):
+    """reduce(a[start:stop]) for each pair, stop > start."""
+    k = np.log2(stops - starts).astype(np.intp)
+    return reduce(table[k, starts], table[k, stops - (1 << k)])
+
+
+def _envelope(t, lo, hi):
+    """Interleave per-bin min/max into a polyline, two points per bin."""
+    v = np.empty(lo.size * 2)
+    v[0::2] = lo
+    v[1::2] = hi
+    return np.repeat(t, 2), v
+
+
+class PeriodicLOD:
+    """Min/max level-of-detail view of a waveform repeated `repeat_count` times.
+
+    Only one cycle is stored; the repeats are addressed logically through
+    global sample index g -> cycle[g % N], so no repeat is ever materialized.
+    """
+
+    def __init__(self, cycle, period, repeat_count):
+        self.cycle = np.asarray(cycle, dtype=float)
+        self.n = self.cycle.size
+        self.dt = period / self.n
+        self.total_samples = self.n * repeat_count + 1   # includes the endpoint
+        doubled = np.concatenate((self.cycle, self.cycle))  # wrap-around ranges
+        self._min = _sparse_table(doubled, np.minimum)
+        self._max = _sparse_table(doubled, np.maximum)
+        self.bounds = (float(self.cycle.min()), float(self.cycle.max()))
+
+    @property
+    def span(self):
+        return 0.0, (self.total_samples - 1) * self.dt
+
+    def view(self, x0, x1, pixels):
+        g0 = max(0, int(np.floor(x0 / self.dt)))
+        g1 = min(self.total_samples, int(np.ceil(x1 / self.dt)) + 1)
+        if g1 <= g0:
+            return np.zeros(0), np.zeros(0)
+        pixels = max(1, int(pixels))
+        if g1 - g0 <= 2 * pixels:
+            g = np.arange(g0, g1)
+            return g * self.dt, self.cycle[g % self.n]
+
+        edges = np.linspace(g0, g1, pixels + 1).astype(np.intp)
+        starts, stops = edges[:-1], edges[1:]
+        keep = stops > starts
+        starts, stops = starts[keep], stops[keep]
+        length = stops - starts
+        full = length >= self.n
+        s = starts % self.n
+        e = s + np.minimum(length, self.n)
+        lo = _range_query(self._min, np.minimum, s, e)
+        hi = _range_query(self._max, np.maximum, s, e)
+        lo[full], hi[full] = self.bounds
+        return _envelope(starts * self.dt, lo, hi)
+
+
+class SampledLOD:
+    """Min/max level-of-detail view of an arbitrary (t, v) sample set."""
+
+    def __init__(self, t, v):
+        self.t = np.asarray(t, dtype=float)
+        self.v = np.asarray(v, dtype=float)
+        self.bounds = (float(self.v.min()), float(self.v.max())) if self.v.size else (0.0, 0.0)
+
+    @property
+    def span(self):
+        return (float(self.t[0]), float(self.t[-1])) if self.t.size else (0.0, 0.0)
+
+    def view(self, x0, x1, pixels):
+        i0 = max(0, np.searchsorted(self.t, x0, side="left") - 1)
+        i1 = min(self.t.size, np.searchsorted(self.t, x1, side="right") + 1)
+        pixels = max(1, int(pixels))
+        if i1 - i0 <= 2 * pixels:
+            return self.t[i0:i1], self.v[i0:i1]
+        edges = np.unique(np.linspace(i0, i1, pixels + 1).astype(np.intp))
+        starts = edges[:-1]
+        lo = np.minimum.reduceat(self.v[:edges[-1]], starts)
+        hi = np.maximum.reduceat(self.v[:edges[-1]], starts)
+        return _envelope(self.t[starts], lo, hi)
+
+
+def preview_lod(params, points_per_cycle=PREVIEW_POINTS_PER_CYCLE):
+    """Level-of-detail source for the preview of `params`."""
+    if params.waveform == "Custom":
+        return SampledLOD(*execution_samples(params))
+    _, cycle = preview_cycle(params, points_per_cycle)
+    return PeriodicLOD(cycle, params.period, params.repeat_count)
+
+
+class LodLine:
+    """A Line2D that is re-decimated to the axes' pixel width on zoom/pan."""
+
+    def __init__(self, ax, lod=None, **line_kwargs):
+        self.ax = ax
+        self.lod = lod
+        self.line, = ax.plot([], [], **line_kwargs)
+        ax.callbacks.connect("xlim_changed", self.refresh)
+
+    def refresh(self, ax=None):
+        if self.lod is None:
+            return
+        x0, x1 = self.ax.get_xlim()
+        t, v = self.lod.view(x0, x1, self.ax.bbox.width)
+        self.line.set_data(t, v)
+
+
+class PreviewPlot:
+    """Waveform preview whose artists are created once and updated in place.
+
+    The steady-voltage marker and legend are animated artists: changing only
+    the steady voltage restores the cached background and blits them instead
+    of redrawing the figure.
+    """
+
+    def __init__(self, figure, canvas):
+        self.canvas = canvas
+        self.ax = figure.add_subplot(111)
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_ylabel("Voltage (V)")
+        self.ax.set_title("Waveform Preview")
+        self.waveform = LodLine(self.ax)
+        self.steady_line = self.ax.axhline(y=0.0, color='red', linestyle='--', animated=True)
+        self.legend = self.ax.legend(handles=[self.steady_line], labels=["Steady Voltage"])
+        self.legend.set_animated(True)
+        self._background = None
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def show(self, lod, steady_voltage):
+        """Full update: new waveform, view reset to its span, y autoscaled."""
+        self.waveform.lod = lod
+        self._set_steady(steady_voltage)
+        x0, x1 = lod.span
+        if x1 <= x0:
+            x1 = x0 + 1.0
+        self.ax.set_xlim(x0, x1)  # Zoomable area
+        self.waveform.refresh()
+        self._autoscale_y()
+        self.canvas.draw_idle()
+
+    def set_steady(self, steady_voltage):
+        """Move only the steady marker, blitting when it stays in view."""
+        self._set_steady(steady_voltage)
+        y0, y1 = self.ax.get_ylim()
+        if self._background is None or not (y0 <= steady_voltage <= y1):
+            self._autoscale_y()
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_animated()
+        self.canvas.blit(self.ax.bbox)
+
+    def _set_steady(self, steady_voltage):
+        self.steady_line.set_ydata([steady_voltage, steady_voltage])
+        self.legend.get_texts()[0].set_text(f"Steady Voltage ({steady_voltage:.2f} V)")
+
+    def _autoscale_y(self):
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+
+    def _draw_animated(self):
+        self.ax.draw_artist(self.steady_line)
+        self.ax.draw_artist(self.legend)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_animated()
@@ -0,0 +1,275 @@
+import mmap
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+
+LOG_MAGIC = b"K2400LOG"
+LOG_VERSION = 1
+HEADER_SIZE = 64
+GROW_RECORDS = 1 << 16           # file grows 2 MB at a time
+LOG_DIR = "run_logs"
+
+# Record kinds
+STREAMED = 0     # written point by point by the host; sent_at is measured
+PLAYED = 1       # list/sweep point played by the trigger model; sent_at is INIT + k * interval
+HELD = 2         # fixed-level hold; one record for the whole hold
+
+HEADER_DTYPE = np.dtype({
+    "names": ["magic", "version", "record_size", "count", "start_time", "interval"],
+    "formats": ["S8", "<u4", "<u4", "<u8", "<f8", "<f8"],
+    "offsets": [0, 8, 12, 16, 24, 32],
+    "itemsize": HEADER_SIZE,
+})
+RECORD_DTYPE = np.dtype({
+    "names": ["sent_at", "setpoint", "sample", "kind", "voltage", "current"],
+    "formats": ["<f8", "<f8", "<u4", "u1", "<f4", "<f4"],
+    "offsets": [0, 8, 16, 20, 24, 28],
+    "itemsize": 32,
+})
+
+
+class RunLogger:
+    """Append-only, memory-mapped log of every commanded setpoint.
+
+    Records are fixed width (RECORD_DTYPE) after a HEADER_SIZE header.
+    An append is a store into the mapped file plus a bump of the header
+    count, so the send loop never blocks on disk I/O and a crashed run
+    still leaves a readable log. The file grows in GROW_RECORDS steps and
+    is trimmed to its records on close. `sent_at` is seconds on the
+    perf_counter clock since `start()` (the run's schedule origin);
+    `start_time` in the header is the same instant on the wall clock.
+    """
+
+    def __init__(self, path, interval=0.0, grow_records=GROW_RECORDS):
+        self.path = path
+        self.grow_records = grow_records
+        self._origin = time.perf_counter()
+        self._file = open(path, "w+b")
+        self._mm = None
+        self._capacity = 0
+        self._count = 0
+        self._sample = 0
+        self._map(grow_records)
+        header = self._header[0]
+        header["magic"] = LOG_MAGIC
+        header["version"] = LOG_VERSION
+        header["record_size"] = RECORD_DTYPE.itemsize
+        header["interval"] = interval
+        self.start(self._origin)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def sample(self):
+        """Waveform sample index the next record starts at."""
+        return self._sample
+
+    def _map(self, capacity):
+        if self._mm is not None:
+            # numpy views pin the mapping; drop them before remapping
+            self._header = self._records = self._count_field = None
+            self._mm.close()
+        self._file.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._header = np.ndarray(1, HEADER_DTYPE, buffer=self._mm)
+        self._count_field = self._header["count"]
+        self._records = np.ndarray(capacity, RECORD_DTYPE, buffer=self._mm, offset=HEADER_SIZE)
+        self._capacity = capacity
+
+    def _reserve(self, n):
+        if self._count + n > self._capacity:
+            grow = max(n, self.grow_records)
+            self._map(self._capacity + grow)
+
+    def start(self, origin=None):
+        """Set the perf_counter reading that log time 0 (sample 0) refers to.
+
+        Runs call this before their first record; a logger holds one run.
+        """
+        self._origin = time.perf_counter() if origin is None else origin
+        self._header["start_time"] = time.time() - (time.perf_counter() - self._origin)
+
+    def skip(self, samples):
+        """Advance the sample index over samples that need no record."""
+        self._sample += samples
+
+    def append(self, setpoint, sent_at, samples=1, kind=STREAMED):
+        """Log one setpoint held for `samples` waveform samples."""
+        if self._count == self._capacity:
+            self._reserve(1)
+        self._records[self._count] = (sent_at - self._origin, setpoint, self._sample, kind, np.nan, np.nan)
+        self._count += 1
+        self._count_field[0] = self._count
+        self._sample += samples
+
+    def extend(self, setpoints, sent_at, kind=PLAYED):
+        """Log a block of consecutive one-sample setpoints (a played segment)."""
+        n = len(setpoints)
+        self._reserve(n)
+        recs = self._records[self._count:self._count + n]
+        recs["sent_at"] = np.asarray(sent_at) - self._origin
+        recs["setpoint"] = setpoints
+        recs["sample"] = np.arange(self._sample, self._sample + n)
+        recs["kind"] = kind
+        recs["voltage"] = recs["current"] = np.nan
+        self._count += n
+        self._count_field[0] = self._count
+        self._sample += n
+
+    def set_sent_at(self, first, sent_at):
+        """Correct the send times (perf_counter) of the records from `first` on."""
+        n = min(len(sent_at), self._count - first)
+        self._records["sent_at"][first:first + n] = np.asarray(sent_at[:n]) - self._origin
+
+    def fill_readings(self, first, measurement):
+        """Attach trace-buffer readings to the played records logged since `first`.
+
+        Readings map in order onto PLAYED records, the same points the
+        trigger model measured.
+        """
+        recs = self._records[first:self._count]
+        idx = np.flatnonzero(recs["kind"] == PLAYED)[:len(measurement)]
+        recs["voltage"][idx] = measurement.voltage[:idx.size]
+        recs["current"][idx] = measurement.current[:idx.size]
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._header = self._records = self._count_field = None
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(HEADER_SIZE + self._count * RECORD_DTYPE.itemsize)
+        self._file.close()
+
+
+def new_log_path(name, directory=LOG_DIR):
+    """Timestamped log file path for a run of `name`, creating `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(directory, f"{name.replace(' ', '_')}_{stamp}.k2log")
+
+
+class TeeLog:
+    """Forwards the run loop's log calls to several loggers (e.g. a RunLogger
+    and a live.LiveBuffer). Its length is the first logger's."""
+
+    def __init__(self, *logs):
+        self.logs = logs
+
+    def __len__(self):
+        return len(self.logs[0])
+
+    def start(self, origin=None):
+        for log in self.logs:
+            log.start(origin)
+
+    def skip(self, samples):
+        for log in self.logs:
+            log.skip(samples)
+
+    def append(self, setpoint, sent_at, samples=1, kind=STREAMED):
+        for log in self.logs:
+            log.append(setpoint, sent_at, samples, kind)
+
+    def extend(self, setpoints, sent_at, kind=PLAYED):
+        for log in self.logs:
+            log.extend(setpoints, sent_at, kind)
+
+    def set_sent_at(self, first, sent_at):
+        for log in self.logs:
+            log.set_sent_at(first, sent_at)
+
+    def fill_readings(self, first, measurement):
+        for log in self.logs:
+            log.fill_readings(first, measurement)
+
+
+def tee_log(*logs):
+    """One log hook for any number of loggers; None entries are left out."""
+    logs = [log for log in logs if log is not None]
+    if len(logs) > 1:
+        return TeeLog(*logs)
+    return logs[0] if logs else None
+
+
+def run_logger(path, interval=0.0):
+    """RunLogger context for `path`, or a no-op one yielding None without a path."""
+    if path is None:
+        return nullcontext()
+    return RunLogger(path, interval)
+
+
+class RunLog:
+    """Read-only view of a RunLogger file.
+
+    The records are a lazily paged np.memmap, so multi-GB logs open
+    instantly and only the slices actually touched are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if header.size == 0 or header[0]["magic"] != LOG_MAGIC:
+            raise ValueError(f"Not a run log: {path}")
+        header = header[0]
+        if header["record_size"] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Unsupported run log record size: {header['record_size']}")
+        self.version = int(header["version"])
+        self.start_time = float(header["start_time"])
+        self.interval = float(header["interval"])
+        # A crashed run leaves preallocated space past the last counted record
+        available = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        count = int(min(header["count"], available))
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def sent_at(self):
+        return self.records["sent_at"]
+
+    @property
+    def setpoint(self):
+        return self.records["setpoint"]
+
+    @property
+    def sample(self):
+        return self.records["sample"]
+
+    @property
+    def kind(self):
+        return self.records["kind"]
+
+    @property
+    def voltage(self):
+        return self.records["voltage"]
+
+    @property
+    def current(self):
+        return self.records["current"]
+
+    def scheduled_at(self):
+        """Nominal send time of each record (sample index * interval)."""
+        return self.sample * self.interval
+
+    def send_errors(self):
+        """sent_at minus the nominal time, for the host-streamed records."""
+        streamed = self.kind == STREAMED
+        return self.sent_at[streamed] - self.scheduled_at()[streamed]
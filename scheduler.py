@@ -0,0 +1,157 @@
+import sys
+import time
+
+import numpy as np
+
+
+STRETCH = "stretch"   # late sample: send it now and shift every later deadline
+SKIP = "skip"         # late sample: drop it if its whole slot has already passed
+POLICIES = (STRETCH, SKIP)
+
+# time.sleep() overshoots by up to one timer tick (~15.6 ms on Windows), so the
+# last stretch before a deadline is spun instead of slept.
+SPIN_THRESHOLD = 0.016 if sys.platform == "win32" else 0.002
+# A sample is only counted late past this margin
+LATE_TOLERANCE = 0.001
+
+
+def sleep_until(deadline, clock=time.perf_counter, spin_threshold=SPIN_THRESHOLD):
+    """Sleep most of the way to `deadline`, then spin the rest."""
+    remaining = deadline - clock()
+    if remaining > spin_threshold:
+        time.sleep(remaining - spin_threshold)
+    while clock() < deadline:
+        time.sleep(0)  # yield the GIL so other instrument threads keep running
+
+
+class TimingReport:
+    """Per-sample emission error of one scheduled run."""
+
+    def __init__(self, interval, policy, errors, skipped, late, samples=(), sent_at=()):
+        self.interval = interval
+        self.policy = policy
+        self.errors = np.asarray(errors, dtype=float)  # actual - deadline (s)
+        self.skipped = skipped
+        self.late = late
+        self.samples = np.asarray(samples, dtype=np.int64)   # sample index of each send
+        self.sent_at = np.asarray(sent_at, dtype=float)      # its clock time
+
+    @property
+    def sent(self):
+        return self.errors.size
+
+    @property
+    def mean_error(self):
+        return float(self.errors.mean()) if self.errors.size else 0.0
+
+    @property
+    def max_error(self):
+        return float(np.abs(self.errors).max()) if self.errors.size else 0.0
+
+    def retime(self, sent_at):
+        """Replace the send times (e.g. enqueue times) with the real ones.
+
+        Each error shifts by the same amount as its send time.
+        """
+        sent_at = np.asarray(sent_at, dtype=float)
+        n = min(sent_at.size, self.sent_at.size)
+        self.errors = self.errors.copy()
+        self.errors[:n] += sent_at[:n] - self.sent_at[:n]
+        self.sent_at = self.sent_at.copy()
+        self.sent_at[:n] = sent_at[:n]
+
+    def percentile(self, q):
+        return float(np.percentile(np.abs(self.errors), q)) if self.errors.size else 0.0
+
+    def summary(self):
+        return (f"{self.sent} sent, {self.skipped} skipped, {self.late} late | "
+                f"error mean {self.mean_error * 1e3:.2f} ms, "
+                f"p99 {self.percentile(99) * 1e3:.2f} ms, max {self.max_error * 1e3:.2f} ms")
+
+
+class DeadlineScheduler:
+    """Emit samples at absolute deadlines t0 + k * interval on perf_counter.
+
+    Sleeps most of the way to each deadline and spins the rest, so write
+    latency and formatting cost don't accumulate into drift. What happens
+    to a sample that is already late is decided by `policy`.
+    """
+
+    def __init__(self, interval, policy=STRETCH, spin_threshold=SPIN_THRESHOLD,
+                 late_tolerance=LATE_TOLERANCE, clock=time.perf_counter):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown late-sample policy: {policy}")
+        self.interval = interval
+        self.policy = policy
+        self.spin_threshold = spin_threshold
+        self.late_tolerance = late_tolerance
+        self.clock = clock
+        self.start()
+
+    def start(self, t0=None):
+        self.t0 = self.clock() if t0 is None else t0
+        self.index = 0
+        self.shift = 0.0
+        self.errors = []
+        self.samples = []
+        self.sent_times = []
+        self.skipped = 0
+        self.late = 0
+        self._due = self.t0
+        self._span = 1
+
+    def hold(self, duration):
+        """Push the remaining schedule back, e.g. by the time spent paused."""
+        self.shift += duration
+
+    def deadline(self, index=None):
+        index = self.index if index is None else index
+        return self.t0 + self.shift + index * self.interval
+
+    def sleep_until(self, deadline):
+        sleep_until(deadline, self.clock, self.spin_threshold)
+
+    def advance(self, span):
+        """Move past `span` sample slots without sending anything."""
+        self.index += span
+
+    def wait_slot(self, span=1):
+        """Wait for the next setpoint's deadline; it covers `span` samples.
+
+        Returns False when the setpoint should be skipped (SKIP policy and
+        its whole slot is already over); the caller then moves on without
+        writing.
+        """
+        deadline = self._due = self.deadline()
+        self._span = span
+        now = self.clock()
+        if now > deadline + self.late_tolerance:
+            if self.policy == SKIP and now >= deadline + span * self.interval:
+                self.skipped += 1
+                self.index += span
+                return False
+            self.late += 1
+            if self.policy == STRETCH:
+                self.shift += now - deadline
+        else:
+            self.sleep_until(deadline)
+        return True
+
+    def mark_sent(self, sent_at=None):
+        """Record the emission time of the sample whose slot was just granted.
+
+        The error is measured against the deadline the sample had when it
+        came due, so stretched samples still report their lateness.
+        """
+        sent_at = self.clock() if sent_at is None else sent_at
+        self.errors.append(sent_at - self._due)
+        self.samples.append(self.index)
+        self.sent_times.append(sent_at)
+        self.index += self._span
+
+    def finish(self, wait=True):
+        """Wait out the last sample's hold time and return the timing report."""
+        if wait:
+            self.sleep_until(self.deadline())
+        return TimingReport(self.interval, self.policy, self.errors, self.skipped, self.late,
+                            self.samples, self.sent_times)
@@ -0,0 +1,106 @@
+from batching import CommandBatch
+
+
+class ShadowedInstrument:
+    """VISA session wrapper that keeps a shadow copy of the instrument's settings.
+
+    Every `HEADER value` command written through it updates the shadow, so
+    `ensure()` can skip settings the instrument already has. *RST clears
+    the shadow (back to RESET_STATE), and any I/O error invalidates it,
+    since the instrument may have taken only part of a command. Everything
+    else is delegated to the wrapped session.
+    """
+
+    # Settings *RST is documented to leave behind
+    RESET_STATE = {"OUTP": "OFF"}
+    # Spellings of the same setting
+    ALIASES = {"SOUR:VOLT:LEV": "SOUR:VOLT", "OUTP:STAT": "OUTP"}
+
+    def __init__(self, instrument):
+        self.__dict__["_instrument"] = instrument
+        self.__dict__["state"] = {}
+        self.__dict__["synced"] = False   # configured since the last reset/invalidation
+
+    def __getattr__(self, name):
+        return getattr(self._instrument, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self._instrument, name, value)  # timeout, terminations, ...
+
+    @classmethod
+    def _key(cls, header):
+        header = header.upper()
+        return cls.ALIASES.get(header, header)
+
+    def _record(self, message):
+        # A batched message holds several ';'-joined, ':'-rooted commands
+        for command in message.split(";"):
+            command = command.strip().lstrip(":")
+            if command.upper().startswith("*RST"):
+                self.state.clear()
+                self.state.update(self.RESET_STATE)
+                self.synced = False
+                continue
+            header, _, value = command.partition(" ")
+            if value and not header.startswith("*"):
+                self.state[self._key(header)] = value.strip().upper()
+
+    def _guarded(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            self.invalidate()
+            raise
+
+    def write(self, command):
+        result = self._guarded(self._instrument.write, command)
+        self._record(command)
+        return result
+
+    def write_raw(self, message):
+        """Unrecorded write of preencoded bytes, for setpoint streaming only."""
+        return self._guarded(self._instrument.write_raw, message)
+
+    def query(self, command, *args, **kwargs):
+        return self._guarded(self._instrument.query, command, *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._guarded(self._instrument.read, *args, **kwargs)
+
+    def query_binary_values(self, command, *args, **kwargs):
+        return self._guarded(self._instrument.query_binary_values, command, *args, **kwargs)
+
+    def cached(self, header):
+        """Last value written for `header`, or None if unknown."""
+        return self.state.get(self._key(header))
+
+    def ensure(self, header, value):
+        """Write `header value` unless the shadow says it is already set.
+
+        Returns True when the command was sent.
+        """
+        value = str(value)
+        if self.cached(header) == value.upper():
+            return False
+        self.write(f"{header} {value}")
+        return True
+
+    def invalidate(self):
+        """Forget everything; the next configuration starts from *RST."""
+        self.state.clear()
+        self.synced = False
+
+    def resync(self):
+        """Force a full reconfiguration on the next run (same as invalidate)."""
+        self.invalidate()
+
+
+def ensure(instrument, header, value):
+    """`instrument.ensure` for shadowed sessions and batches, a plain write otherwise."""
+    if isinstance(instrument, (ShadowedInstrument, CommandBatch)):
+        return instrument.ensure(header, value)
+    instrument.write(f"{header} {value}")
+    return True
@@ -0,0 +1,478 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from batching import INPUT_BUFFER_BYTES
+from compiler import LIST_POINT_OVERHEAD, TRIGGER_MAX_PRODUCT
+from execution import GPIB_BYTE_TIME, INSTRUMENT_COMMAND_RATE, LIST_VALUE_PARSE_TIME
+from scheduler import sleep_until
+
+
+SIM_PREFIX = "SIM::"              # "SIM::ASRL4::INSTR" opens a simulated instrument
+SIM_IDN = "KEITHLEY INSTRUMENTS INC.,MODEL 2400,SIM0001,C30 (simulated)"
+
+SERIAL_BITS_PER_BYTE = 10         # start + 8 data + stop
+COMMAND_LATENCY = 1.0 / INSTRUMENT_COMMAND_RATE   # s to parse and execute one command
+LIST_VALUE_LATENCY = LIST_VALUE_PARSE_TIME   # extra s per SOUR:LIST:VOLT value
+LOAD_RESISTANCE = 1e3             # ohm, for the simulated current readings
+
+# SCPI errors the simulator reports
+ERRORS = {
+    -102: "Syntax error",
+    -113: "Undefined header",
+    -213: "Init ignored",
+    -221: "Settings conflict",
+    -222: "Data out of range",
+}
+ESR_OPC = 1
+ESR_CME = 32                      # command error (-1xx)
+ESR_EXE = 16                      # execution error (-2xx)
+STB_ESB = 32
+
+
+class VirtualClock:
+    """A clock that only moves when someone waits on it.
+
+    It only covers code that waits through the simulator itself, such as
+    writes, queries and reads driven directly against a
+    SimulatedSourceMeter; those runs are deterministic and take no real
+    time. run_waveform is not covered: the DeadlineScheduler, the
+    CompletionWaiter and pauses wait on the real clock, and the virtual
+    clock doesn't advance while they do, so list runs would never
+    complete. Simulate those with the default (real) clock.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def wait_until(self, deadline):
+        self.now = max(self.now, deadline)
+
+
+def _real_wait_until(deadline):
+    sleep_until(deadline)
+
+
+class SimulatedSourceMeter:
+    """In-process stand-in for a Keithley 2400 VISA session.
+
+    It understands the SCPI subset this app sends (source, output, trigger
+    model with list/sweep/fixed modes, trace buffer, status system) and
+    models the timing that matters for it:
+
+    - the link: a write blocks for its bytes at the resource's byte time
+      (10 bits per byte at `baud_rate` on ASRL, ~1 MB/s otherwise);
+    - the parser: commands execute one after another, COMMAND_LATENCY each
+      after their message arrived, so the output changes late, not at
+      the write;
+    - the input buffer: bytes waiting for the parser are limited to
+      INPUT_BUFFER_BYTES. Overflowing bytes are lost, and the rest of the
+      line runs into the next message, so the instrument reports -102/-113
+      just like the real one does when it is flooded;
+    - the trigger model: INIT plays ARM:COUN x TRIG:COUN points at
+      SOUR:DEL + LIST_POINT_OVERHEAD each, overlapped with further commands.
+      With TRIG:SOUR BUS it only arms the model: until *TRG or ABOR, *OPC
+      stays pending and another INIT is refused with -213.
+
+    The result is a function of command arrival times only. Every change of
+    the output voltage is recorded (`timeline()`). A VirtualClock avoids
+    real waiting for code that only talks to the simulator (see its
+    caveat about run_waveform).
+    """
+
+    def __init__(self, resource_name="ASRL1::INSTR", clock=time.perf_counter, wait_until=None,
+                 input_buffer=INPUT_BUFFER_BYTES, command_latency=COMMAND_LATENCY):
+        self.resource_name = resource_name
+        self.clock = clock
+        self.wait_until = wait_until or getattr(clock, "wait_until", _real_wait_until)
+        self.input_buffer = input_buffer
+        self.command_latency = command_latency
+        self.timeout = 2000          # ms, like a VISA session
+        self.baud_rate = 9600
+        self.write_termination = '\n'
+        self.read_termination = '\n'
+        self._lock = threading.Lock()
+
+        self.bytes_received = 0
+        self.commands = 0
+        self.overflows = 0           # messages that lost bytes to a full input buffer
+        self.error_log = []          # (time, code) of every error ever raised
+        self._times = []             # output timeline: time of each change...
+        self._volts = []             # ...and the output voltage from then on
+        self.origin = clock()        # timeline times are relative to this
+        self._link_free = self.origin
+        self._parser_free = self.origin
+        self._backlog = collections.deque()   # (parse end time, bytes) not yet parsed
+        self._partial = ""           # line whose terminator was lost
+        self._responses = collections.deque()  # (ready time, reply)
+        self._reset(self.origin)
+
+    # --- state -----------------------------------------------------------
+
+    def _reset(self, t):
+        self.output = False
+        self.level = 0.0
+        self.mode = "FIXED"
+        self.source_delay = 0.0
+        self.trigger_source = "IMM"
+        self.trigger_count = 1
+        self.arm_count = 1
+        self.list_values = []
+        self.sweep = [0.0, 0.0, 2500]   # start, stop, points
+        self.trace_points = 100
+        self.trace_feed = False
+        self.trace = []              # (time, voltage, current)
+        self.data_format = "ASC"
+        self.errors = collections.deque()
+        self.esr = 0
+        self.ese = 0
+        self.sre = 0
+        self._opc_at = None          # when the pending *OPC sets the OPC bit
+        self._op_end = t             # end of the running trigger model
+        self._armed = False          # INIT with TRIG:SOUR BUS, waiting for *TRG
+        self._played = collections.deque()   # (time, voltage) of points not yet reached
+        self._record(t)
+
+    def _record(self, t, volts=None):
+        value = (self.level if volts is None else volts) if self.output else 0.0
+        if self._volts and self._volts[-1] == value:
+            return
+        self._times.append(t)
+        self._volts.append(value)
+
+    def _error(self, t, code):
+        self.errors.append(code)
+        self.error_log.append((t, code))
+        self.esr |= ESR_CME if code > -200 else ESR_EXE
+
+    def _status_byte(self, t):
+        if self._opc_at is not None and t >= self._opc_at:
+            self.esr |= ESR_OPC
+            self._opc_at = None
+        return STB_ESB if self.esr & self.ese else 0
+
+    @property
+    def byte_time(self):
+        if self.resource_name.upper().startswith("ASRL"):
+            return SERIAL_BITS_PER_BYTE / self.baud_rate
+        return GPIB_BYTE_TIME
+
+    # --- VISA session interface -------------------------------------------
+
+    def write(self, message):
+        self.write_raw((message + self.write_termination).encode("ascii"))
+
+    def write_raw(self, data):
+        with self._lock:
+            done = self._receive(data)
+        self.wait_until(done)
+
+    def read(self):
+        with self._lock:
+            if not self._responses:
+                ready = None
+            else:
+                ready, reply = self._responses.popleft()
+        if ready is None:
+            self.wait_until(self.clock() + self.timeout / 1000)
+            raise TimeoutError("VI_ERROR_TMO (-1073807339): Timeout expired before operation completed.")
+        size = len(reply) * 4 + 3 if isinstance(reply, np.ndarray) else len(reply) + 1
+        self.wait_until(max(ready, self.clock()) + size * self.byte_time)
+        return reply
+
+    def query(self, message, delay=None):
+        self.write(message)
+        return self.read()
+
+    def query_binary_values(self, message, datatype="f", is_big_endian=False, container=list,
+                            data_points=None, **kwargs):
+        self.write(message)
+        reply = self.read()
+        values = np.asarray(reply if isinstance(reply, np.ndarray) else
+                            [float(x) for x in reply.split(",") if x], dtype=np.float32)
+        if data_points is not None and values.size != data_points:
+            raise ValueError(f"Expected {data_points} values, got {values.size}")
+        return container(values)
+
+    def read_stb(self):
+        with self._lock:
+            return self._status_byte(self.clock())
+
+    def clear(self):
+        """Device clear: drop unparsed input and unread replies."""
+        with self._lock:
+            self._partial = ""
+            self._backlog.clear()
+            self._responses.clear()
+            self._parser_free = max(self._parser_free, self.clock())
+
+    def close(self):
+        pass
+
+    # --- results ------------------------------------------------------------
+
+    def timeline(self):
+        """(times, volts): the output voltage from each time on, up to now."""
+        with self._lock:
+            self._settle(self.clock())
+            t = np.array(self._times)
+            v = np.array(self._volts)
+        return t - self.origin, v
+
+    def error_codes(self):
+        return [code for _, code in self.error_log]
+
+    # --- link and parser ------------------------------------------------------
+
+    def _receive(self, data):
+        """Account for one message on the link; returns when its last byte is in."""
+        start = max(self.clock(), self._link_free)
+        done = self._link_free = start + len(data) * self.byte_time
+        self.bytes_received += len(data)
+
+        while self._backlog and self._backlog[0][0] <= start:
+            self._backlog.popleft()
+        room = self.input_buffer - sum(n for _, n in self._backlog)
+        if len(data) > room:
+            self.overflows += 1
+            data = data[:max(room, 0)]
+        text = self._partial + data.decode("ascii", "replace")
+        if not text.endswith("\n"):
+            # The terminator was lost; the rest runs into the next message
+            self._partial = text
+            return done
+        self._partial = ""
+
+        t = max(done, self._parser_free)
+        for line in text.splitlines():
+            for command in line.split(";"):
+                t = self._execute(command.strip(), t)
+        self._parser_free = t
+        self._backlog.append((t, len(data)))
+        return done
+
+    def _execute(self, command, t):
+        """Run one command parsed at `t`; returns when the parser is free again."""
+        self._settle(t)
+        if not command:
+            return t
+        self.commands += 1
+        header, _, args = command.lstrip(":").partition(" ")
+        header = header.upper()
+        handler = self._HANDLERS.get(header)
+        cost = self.command_latency
+        if handler is None:
+            self._error(t, -113)
+            return t + cost
+        if header == "SOUR:LIST:VOLT":
+            cost += LIST_VALUE_LATENCY * (args.count(",") + 1)
+        t += cost
+        try:
+            handler(self, args.strip(), t)
+        except ValueError:
+            self._error(t, -102)
+        return t
+
+    def _settle(self, t):
+        """Move played trigger-model points up to `t` into the timeline."""
+        while self._played and self._played[0][0] <= t:
+            at, v = self._played.popleft()
+            self._record(at, v)
+
+    def _reply(self, t, reply):
+        self._responses.append((t, reply))
+
+    # --- commands -------------------------------------------------------------
+
+    def _rst(self, args, t):
+        self._played.clear()
+        self._reset(t)
+
+    def _cls(self, args, t):
+        self.errors.clear()
+        self.esr = 0
+        self._opc_at = None
+
+    def _ese(self, args, t):
+        self.ese = int(args)
+
+    def _sre(self, args, t):
+        self.sre = int(args)
+
+    def _operation_end(self, t):
+        # An armed model's operation only ends with *TRG or ABOR
+        return float("inf") if self._armed else max(t, self._op_end)
+
+    def _opc(self, args, t):
+        self._opc_at = self._operation_end(t)
+
+    def _opc_query(self, args, t):
+        self._reply(self._operation_end(t), "1")
+
+    def _idn(self, args, t):
+        self._reply(t, SIM_IDN)
+
+    def _stb(self, args, t):
+        self._reply(t, str(self._status_byte(t)))
+
+    def _esr_query(self, args, t):
+        self._status_byte(t)
+        esr, self.esr = self.esr, 0
+        self._reply(t, str(esr))
+
+    def _syst_err(self, args, t):
+        if self.errors:
+            code = self.errors.popleft()
+            self._reply(t, f'{code},"{ERRORS[code]}"')
+        else:
+            self._reply(t, '0,"No error"')
+
+    def _ignore(self, args, t):
+        pass
+
+    def _volt(self, args, t):
+        level = float(args)
+        if abs(level) > 21.0:
+            self._error(t, -222)
+            return
+        self.level = level
+        if self.mode == "FIXED" and t >= self._op_end:
+            self._record(t)
+
+    def _volt_query(self, args, t):
+        self._reply(t, f"{self.level:.6E}")
+
+    def _volt_mode(self, args, t):
+        mode = args.upper()
+        if mode not in ("FIXED", "FIX", "LIST", "SWE", "SWEEP"):
+            raise ValueError(args)
+        self.mode = {"FIX": "FIXED", "SWEEP": "SWE"}.get(mode, mode)
+
+    def _source_delay(self, args, t):
+        self.source_delay = float(args)
+
+    def _trig_source(self, args, t):
+        self.trigger_source = args.upper()[:3]
+
+    def _trig_count(self, args, t):
+        self.trigger_count = int(args)
+
+    def _arm_count(self, args, t):
+        self.arm_count = int(args)
+
+    def _list_volt(self, args, t):
+        self.list_values = [float(v) for v in args.split(",")]
+
+    def _sweep_start(self, args, t):
+        self.sweep[0] = float(args)
+
+    def _sweep_stop(self, args, t):
+        self.sweep[1] = float(args)
+
+    def _sweep_points(self, args, t):
+        self.sweep[2] = int(args)
+
+    def _output(self, args, t):
+        state = args.upper()
+        if state not in ("ON", "OFF", "1", "0"):
+            raise ValueError(args)
+        self.output = state in ("ON", "1")
+        self._record(t)
+
+    def _output_query(self, args, t):
+        self._reply(t, "1" if self.output else "0")
+
+    def _init(self, args, t):
+        if t < self._op_end or self._armed:
+            self._error(t, -213)
+            return
+        if self.trigger_source == "BUS":
+            self._armed = True   # nothing plays by itself
+            return
+        if self.arm_count * self.trigger_count > TRIGGER_MAX_PRODUCT:
+            self._error(t, -221)
+            return
+        if self.mode == "LIST":
+            values = self.list_values
+        elif self.mode == "SWE":
+            start, stop, points = self.sweep
+            values = np.linspace(start, stop, points).tolist()
+        else:
+            values = [self.level]
+        count = self.trigger_count
+        cycle = [values[k % len(values)] for k in range(count)]
+        step = self.source_delay + LIST_POINT_OVERHEAD
+        for k, v in enumerate(cycle * self.arm_count):
+            at = t + k * step
+            self._played.append((at, v))
+            if self.trace_feed and len(self.trace) < self.trace_points:
+                self.trace.append((at + self.source_delay, v, v / LOAD_RESISTANCE))
+        self._op_end = t + len(cycle) * self.arm_count * step
+        if self.mode != "FIXED" and self._played:
+            self.level = self._played[-1][1]   # the source stays at the last point
+
+    def _trigger(self, args, t):
+        if self._armed:
+            self._armed = False   # the armed fixed-mode point is taken
+            if self._opc_at is not None:
+                self._opc_at = min(self._opc_at, t)
+
+    def _abort(self, args, t):
+        self._armed = False
+        self._played.clear()
+        self.trace = [r for r in self.trace if r[0] <= t]
+        self._op_end = min(self._op_end, t)
+        if self._opc_at is not None:
+            self._opc_at = min(self._opc_at, t)   # the aborted operation counts as complete
+
+    def _trace_clear(self, args, t):
+        self.trace = []
+
+    def _trace_points(self, args, t):
+        self.trace_points = int(args)
+
+    def _trace_feed_control(self, args, t):
+        self.trace_feed = args.upper().startswith("NEXT")
+
+    def _trace_count(self, args, t):
+        self._reply(t, str(sum(1 for r in self.trace if r[0] <= t)))
+
+    def _trace_data(self, args, t):
+        rows = [r for r in self.trace if r[0] <= t]
+        data = np.array([(v, i, at - self.origin) for at, v, i in rows], dtype=np.float32).reshape(-1)
+        if self.data_format == "SRE":
+            self._reply(t, data)
+        else:
+            self._reply(t, ",".join(f"{x:.6E}" for x in data.tolist()))
+
+    def _data_format(self, args, t):
+        self.data_format = args.upper()[:3]
+
+    _HANDLERS = {
+        "*RST": _rst, "*CLS": _cls, "*ESE": _ese, "*SRE": _sre, "*OPC": _opc,
+        "*OPC?": _opc_query, "*IDN?": _idn, "*STB?": _stb, "*ESR?": _esr_query, "*TRG": _trigger,
+        "SYST:ERR?": _syst_err,
+        "SOUR:FUNC": _ignore, "SOUR:VOLT:RANG": _ignore, "SENS:CURR:PROT": _ignore,
+        "SOUR:VOLT": _volt, "SOUR:VOLT:LEV": _volt, "SOUR:VOLT?": _volt_query,
+        "SOUR:VOLT:MODE": _volt_mode, "SOUR:DEL": _source_delay,
+        "SOUR:LIST:VOLT": _list_volt, "SOUR:SWE:SPAC": _ignore,
+        "SOUR:VOLT:STAR": _sweep_start, "SOUR:VOLT:STOP": _sweep_stop, "SOUR:SWE:POIN": _sweep_points,
+        "TRIG:SOUR": _trig_source, "TRIG:COUN": _trig_count, "ARM:COUN": _arm_count,
+        "OUTP": _output, "OUTP:STAT": _output, "OUTP?": _output_query,
+        "INIT": _init, "ABOR": _abort,
+        "TRAC:CLE": _trace_clear, "TRAC:POIN": _trace_points, "TRAC:FEED": _ignore,
+        "TRAC:FEED:CONT": _trace_feed_control, "TRAC:POIN:ACT?": _trace_count, "TRAC:DATA?": _trace_data,
+        "FORM:ELEM": _ignore, "FORM:DATA": _data_format, "FORM:BORD": _ignore,
+    }
+
+
+def simulated_resource(resource):
+    """The resource a SIM:: name stands for, or None for a real one."""
+    if resource.upper().startswith(SIM_PREFIX):
+        return resource[len(SIM_PREFIX):]
+    return None
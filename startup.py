@@ -0,0 +1,46 @@
+import sys
+import time
+
+
+# Import this module first: its import time is the profile's zero
+_T0 = time.perf_counter()
+
+# Packages whose import dominates startup; the profile shows when each got loaded
+HEAVY_PACKAGES = ("PyQt5", "numpy", "matplotlib", "pyvisa")
+
+
+class StartupProfile:
+    """Print the time from program start to each startup milestone.
+
+    Every mark shows the total and the time since the previous mark, the
+    number of loaded modules and which heavy packages are in by then, so
+    it's visible what the first window waited for and what was deferred.
+    Disabled (every call a no-op) unless `enable()` was called.
+    """
+
+    def __init__(self, stream=None):
+        self.enabled = False
+        self.stream = stream
+        self._last = _T0
+        self._seen = set()
+
+    def enable(self):
+        self.enabled = True
+
+    def mark(self, label):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        loaded = ", ".join(p for p in HEAVY_PACKAGES if p in sys.modules) or "-"
+        print(f"[startup] {(now - _T0) * 1e3:8.1f} ms  +{(now - self._last) * 1e3:7.1f} ms  {label}"
+              f"  ({len(sys.modules)} modules; {loaded})", file=self.stream or sys.stderr, flush=True)
+        self._last = now
+
+    def once(self, label):
+        """Mark `label` only the first time it happens (first preview, first connection...)."""
+        if label not in self._seen:
+            self._seen.add(label)
+            self.mark(label)
+
+
+profile = StartupProfile()
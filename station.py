@@ -0,0 +1,201 @@
+import json
+
+
+STEP_ACTIONS = ("waveform", "pulse", "steady")
+
+# Step states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"     # a step it depends on failed
+
+
+class InstrumentSpec:
+    """One SourceMeter of the station."""
+
+    def __init__(self, name, resource, title=None):
+        self.name = name
+        self.resource = resource
+        self.title = title or f"{name} — {resource}"
+
+    @property
+    def bus(self):
+        return bus_of(self.resource)
+
+
+class Step:
+    """An action on one instrument that may wait for other steps."""
+
+    def __init__(self, step_id, instrument, action, after=(), voltage=None):
+        if action not in STEP_ACTIONS:
+            raise ValueError(f"Step {step_id}: unknown action {action!r}")
+        self.id = step_id
+        self.instrument = instrument
+        self.action = action
+        self.after = tuple(after)
+        self.voltage = voltage   # steady voltage override
+
+    def __repr__(self):
+        return f"Step({self.id!r}, {self.instrument!r}, {self.action!r}, after={list(self.after)})"
+
+
+def bus_of(resource):
+    """Bus a VISA resource talks on; instruments on one bus are used one at a time.
+
+    GPIB devices share their board (GPIB0), a serial port is its own bus,
+    and other interfaces (USB, TCPIP) give each device its own link.
+    """
+    head = resource.split("::")[0].upper()
+    if head.startswith(("GPIB", "ASRL")):
+        return head
+    return resource.upper()
+
+
+class StepPlan:
+    """A DAG of steps, validated for unknown instruments, dependencies and cycles."""
+
+    def __init__(self, steps, instruments=None):
+        self.steps = {}
+        for step in steps:
+            if step.id in self.steps:
+                raise ValueError(f"Duplicate step id {step.id!r}")
+            self.steps[step.id] = step
+        for step in steps:
+            if instruments is not None and step.instrument not in instruments:
+                raise ValueError(f"Step {step.id}: unknown instrument {step.instrument!r}")
+            for dep in step.after:
+                if dep not in self.steps:
+                    raise ValueError(f"Step {step.id}: unknown dependency {dep!r}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        remaining = {sid: set(step.after) for sid, step in self.steps.items()}
+        order = []
+        while remaining:
+            ready = [sid for sid, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle among steps: {sorted(remaining)}")
+            for sid in ready:
+                order.append(sid)
+                del remaining[sid]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    @classmethod
+    def chain(cls, instrument_names, action="waveform"):
+        """One `action` per instrument, strictly one after the other."""
+        steps = []
+        for i, name in enumerate(instrument_names):
+            after = [steps[-1].id] if steps else []
+            steps.append(Step(f"{i + 1}:{name}", name, action, after))
+        return cls(steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+
+class StepScheduler:
+    """Decides which steps of a StepPlan may run now.
+
+    A step is dispatched once all its dependencies are done and no other
+    step is running on its bus, so different buses run concurrently and a
+    shared bus is serialized. A failed step skips everything downstream.
+    The caller runs the steps (threads, Qt workers, ...) and reports each
+    result with `complete`; the scheduler itself never blocks.
+    """
+
+    def __init__(self, plan, bus_of_step):
+        self.plan = plan
+        self.bus_of_step = bus_of_step
+        self.state = {sid: PENDING for sid in plan.steps}
+        self._busy = set()
+
+    @property
+    def finished(self):
+        return all(state not in (PENDING, RUNNING) for state in self.state.values())
+
+    @property
+    def ok(self):
+        return all(state == DONE for state in self.state.values())
+
+    def dispatch(self):
+        """Steps to start now, in plan order; they are marked running."""
+        started = []
+        for sid in self.plan.order:
+            if self.state[sid] != PENDING:
+                continue
+            step = self.plan.steps[sid]
+            bus = self.bus_of_step(step)
+            if bus in self._busy:
+                continue
+            if all(self.state[dep] == DONE for dep in step.after):
+                self.state[sid] = RUNNING
+                self._busy.add(bus)
+                started.append(step)
+        return started
+
+    def complete(self, step_id, ok):
+        step = self.plan.steps[step_id]
+        self._busy.discard(self.bus_of_step(step))
+        self.state[step_id] = DONE if ok else FAILED
+        if not ok:
+            self._skip_dependents(step_id)
+
+    def _skip_dependents(self, step_id):
+        for sid in self.plan.order:
+            step = self.plan.steps[sid]
+            if self.state[sid] == PENDING and any(
+                    self.state[dep] in (FAILED, SKIPPED) for dep in step.after):
+                self.state[sid] = SKIPPED
+
+    def summary(self):
+        counts = {}
+        for state in self.state.values():
+            counts[state] = counts.get(state, 0) + 1
+        return ", ".join(f"{n} {state}" for state, n in counts.items())
+
+
+class Station:
+    """Instruments and an optional step plan, as read from a station file."""
+
+    def __init__(self, instruments, steps=()):
+        self.instruments = instruments
+        names = [spec.name for spec in instruments]
+        if len(set(names)) != len(names):
+            raise ValueError("Instrument names must be unique")
+        self.plan = StepPlan(steps, set(names)) if steps else None
+
+    def spec(self, name):
+        return next(spec for spec in self.instruments if spec.name == name)
+
+    def bus_of_step(self, step):
+        return self.spec(step.instrument).bus
+
+
+def load_station(path):
+    """Read a station file (JSON):
+
+        {"instruments": [{"name": "A", "resource": "GPIB0::24::INSTR"}, ...],
+         "steps": [{"id": "a", "instrument": "A", "action": "waveform"},
+                   {"id": "d", "instrument": "D", "action": "steady",
+                    "voltage": 1.5, "after": ["b", "c"]}, ...]}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    instruments = [InstrumentSpec(item["name"], item["resource"], item.get("title"))
+                   for item in data.get("instruments", [])]
+    if not instruments:
+        raise ValueError(f"{path}: no instruments")
+    steps = [Step(item["id"], item["instrument"], item.get("action", "waveform"),
+                  item.get("after", ()), item.get("voltage"))
+             for item in data.get("steps", [])]
+    return Station(instruments, steps)
+
+
+# The original two-instrument setup
+DEFAULT_STATION = Station([
+    InstrumentSpec("Panel 1", "GPIB0::24::INSTR", "GPIB — Keithley 2400"),
+    InstrumentSpec("Panel 2", "ASRL4::INSTR", "Serial — Keithley 2400"),
+])
@@ -0,0 +1,67 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (
+    QHeaderView, QLabel, QPlainTextEdit, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
+)
+
+
+LATENCY_COLUMNS = ("Command", "Count", "Mean (ms)", "p50 (ms)", "p99 (ms)", "Max (ms)")
+RECENT_EVENTS = 30
+
+
+class StatsPanel(QWidget):
+    """Live view of one instrument's Telemetry: counters, per-command
+    latency histograms and the latest events. Refreshes only while shown."""
+
+    refresh_interval_ms = 1000
+
+    def __init__(self, telemetry, parent=None):
+        super().__init__(parent)
+        self.telemetry = telemetry
+        self.setWindowTitle(f"Stats — {telemetry.name}")
+        layout = QVBoxLayout(self)
+
+        self.counters_label = QLabel()
+        self.counters_label.setWordWrap(True)
+        layout.addWidget(self.counters_label)
+
+        self.latency_table = QTableWidget(0, len(LATENCY_COLUMNS))
+        self.latency_table.setHorizontalHeaderLabels(LATENCY_COLUMNS)
+        self.latency_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.latency_table.verticalHeader().setVisible(False)
+        layout.addWidget(self.latency_table)
+
+        layout.addWidget(QLabel("Recent events"))
+        self.events_view = QPlainTextEdit()
+        self.events_view.setReadOnly(True)
+        layout.addWidget(self.events_view)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.refresh_interval_ms)
+        self.timer.timeout.connect(self.refresh)
+        self.resize(640, 480)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = self.telemetry.snapshot(events=RECENT_EVENTS)
+        counters = snapshot["counters"]
+        self.counters_label.setText(
+            "  ".join(f"{name}: {value}" for name, value in sorted(counters.items())) or "No activity yet")
+
+        latency = snapshot["latency"]
+        self.latency_table.setRowCount(len(latency))
+        for row, (kind, h) in enumerate(latency.items()):
+            values = (kind, str(h["count"]), f"{h['mean_s'] * 1e3:.3f}", f"{h['p50_s'] * 1e3:.3f}",
+                      f"{h['p99_s'] * 1e3:.3f}", f"{h['max_s'] * 1e3:.3f}")
+            for column, text in enumerate(values):
+                self.latency_table.setItem(row, column, QTableWidgetItem(text))
+
+        self.events_view.setPlainText("\n".join(
+            f"{e['t']:10.3f}  {e['kind']:<14} {e['detail']}" for e in reversed(snapshot["events"])))
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+
+
+SYNC_LEAD = 0.05       # s between the last instrument getting ready and the common start
+SYNC_TIMEOUT = 60.0    # s to wait for the other instruments to get ready
+
+
+class SyncStart:
+    """Common start time for runs on several instruments, one worker each.
+
+    Every run configures its instrument, then calls `wait()`; when the last
+    one arrives, all of them get the same perf_counter start time a little
+    in the future and schedule sample 0 at it. A run that fails before
+    getting there should call `abort()` so the others don't wait it out.
+    """
+
+    def __init__(self, parties, lead=SYNC_LEAD, timeout=SYNC_TIMEOUT):
+        self.lead = lead
+        self.t0 = None
+        self._barrier = threading.Barrier(parties, action=self._set_t0, timeout=timeout)
+
+    def _set_t0(self):
+        self.t0 = time.perf_counter() + self.lead
+
+    def wait(self):
+        """Block until every run is ready; returns the shared start time."""
+        self._barrier.wait()
+        return self.t0
+
+    def abort(self):
+        self._barrier.abort()
+
+
+class SkewReport:
+    """Spread of the instruments' schedule errors at each send of a synchronized run."""
+
+    def __init__(self, times, skew):
+        self.times = times        # nominal time of each compared send, s after the common start
+        self.skew = skew          # latest minus earliest instrument (s)
+
+    @property
+    def mean_skew(self):
+        return float(self.skew.mean()) if self.skew.size else 0.0
+
+    @property
+    def max_skew(self):
+        return float(self.skew.max()) if self.skew.size else 0.0
+
+    def percentile(self, q):
+        return float(np.percentile(self.skew, q)) if self.skew.size else 0.0
+
+    def summary(self):
+        if not self.skew.size:
+            return "no common samples"
+        return (f"skew over {self.skew.size} samples: mean {self.mean_skew * 1e3:.2f} ms, "
+                f"p99 {self.percentile(99) * 1e3:.2f} ms, max {self.max_skew * 1e3:.2f} ms")
+
+
+def measure_skew(results, t0):
+    """Per-sample skew between the RunResults of one run started at `t0`.
+
+    A run's error at a send is its host send time minus the nominal
+    t0 + k * interval of that sample; between sends the last error holds,
+    so runs with different intervals or write patterns still compare. At
+    every send of any run (within the span all runs covered), the skew
+    is the spread of the runs' current errors.
+    """
+    timelines = []
+    for result in results:
+        if result is None or result.sample_times is None or not len(result.sample_times[0]):
+            continue
+        k, t = result.sample_times
+        nominal = k * result.interval
+        timelines.append((nominal, t - t0 - nominal))
+    if len(timelines) < 2:
+        return SkewReport(np.zeros(0), np.zeros(0))
+    first = max(nominal[0] for nominal, _ in timelines)
+    last = min(nominal[-1] for nominal, _ in timelines)
+    times = np.unique(np.concatenate([nominal for nominal, _ in timelines]))
+    times = times[(times >= first) & (times <= last)]
+    errors = np.stack([error[np.searchsorted(nominal, times, side="right") - 1]
+                       for nominal, error in timelines])
+    return SkewReport(times, errors.max(axis=0) - errors.min(axis=0))
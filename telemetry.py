@@ -0,0 +1,240 @@
+import collections
+import json
+import os
+import threading
+import time
+
+
+EVENT_CAPACITY = 4096          # events kept in the ring buffer
+SUB_BUCKET_BITS = 5            # 32 linear sub-buckets per power of two: ~3% resolution
+SNAPSHOT_INTERVAL = 5.0        # s between snapshot files
+TELEMETRY_DIR = "telemetry"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of durations, recorded in microseconds.
+
+    Values below 2**SUB_BUCKET_BITS us are counted exactly; above that each
+    power of two is split into 2**(SUB_BUCKET_BITS - 1) equal buckets, so
+    the relative error stays bounded from microseconds to hours with a few
+    hundred counters and recording is a handful of integer operations.
+    """
+
+    _SUB = 1 << SUB_BUCKET_BITS
+    _HALF = _SUB >> 1
+
+    def __init__(self):
+        self.counts = [0] * self._SUB
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    @classmethod
+    def _index(cls, us):
+        if us < cls._SUB:
+            return us
+        shift = us.bit_length() - SUB_BUCKET_BITS
+        return cls._SUB + (shift - 1) * cls._HALF + ((us >> shift) - cls._HALF)
+
+    @classmethod
+    def _bounds(cls, index):
+        """[low, high) in microseconds of a bucket."""
+        if index < cls._SUB:
+            return index, index + 1
+        shift, sub = divmod(index - cls._SUB, cls._HALF)
+        shift += 1
+        low = (sub + cls._HALF) << shift
+        return low, low + (1 << shift)
+
+    def record(self, seconds):
+        index = self._index(max(int(seconds * 1e6), 0))
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Upper edge (s) of the bucket holding the q-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self._bounds(index)[1] / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        result = {"count": self.count, "mean_s": self.mean, "min_s": self.min or 0.0, "max_s": self.max}
+        for q in PERCENTILES:
+            result[f"p{q:g}_s"] = self.percentile(q)
+        return result
+
+
+def command_type(message):
+    """The SCPI header a write/query is filed under ('SOUR:VOLT', '*OPC?', ...).
+
+    Batched messages (';'-joined) count as 'BATCH'.
+    """
+    if isinstance(message, (bytes, bytearray)):
+        message = message.decode("ascii", "replace")
+    if ";" in message:
+        return "BATCH"
+    return message.split(" ", 1)[0].strip().lstrip(":").upper()
+
+
+class Telemetry:
+    """Low-overhead counters, latency histograms and an event ring buffer
+    for one instrument.
+
+    Recording never blocks or allocates beyond the fixed ring buffer: the
+    worker thread that owns the instrument records, and readers (stats
+    panel, snapshot exporter) take copies.
+    """
+
+    def __init__(self, name, capacity=EVENT_CAPACITY, clock=time.perf_counter):
+        self.name = name
+        self.clock = clock
+        self.started = clock()
+        self.events = collections.deque(maxlen=capacity)   # (time, kind, detail)
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self.counters = collections.Counter()
+
+    def event(self, kind, detail=""):
+        self.events.append((self.clock(), kind, detail))
+
+    def count(self, name, n=1):
+        if n:
+            self.counters[name] += n
+
+    def record(self, kind, seconds):
+        self.histograms[kind].record(seconds)
+
+    def record_run(self, result):
+        """Fold a RunResult's late/skipped samples into the counters."""
+        self.count("runs")
+        self.count("samples", result.samples)
+        self.count("setpoint_writes", result.writes)
+        if result.timing is not None:
+            self.count("late", result.timing.late)
+            self.count("skipped", result.timing.skipped)
+        self.event("run", result.summary())
+
+    def snapshot(self, events=50):
+        """Plain-dict copy of everything, with the last `events` events."""
+        recent = list(self.events)[-events:] if events else []
+        return {
+            "name": self.name,
+            "uptime_s": self.clock() - self.started,
+            "counters": dict(self.counters),
+            "latency": {kind: h.snapshot() for kind, h in sorted(list(self.histograms.items()))},
+            "events": [{"t": t - self.started, "kind": kind, "detail": str(detail)} for t, kind, detail in recent],
+        }
+
+
+def telemetry_of(instrument):
+    """The Telemetry attached to an (instrumented) session, or None."""
+    return getattr(instrument, "telemetry", None)
+
+
+class MonitoredInstrument:
+    """VISA session wrapper that times every I/O call into a Telemetry.
+
+    Latencies are filed per SCPI command type ('write SOUR:VOLT',
+    'query *STB?', ...); timeouts and other I/O errors are counted and
+    logged as events. Everything else is delegated to the wrapped session.
+    """
+
+    def __init__(self, instrument, telemetry):
+        self.__dict__["_instrument"] = instrument
+        self.__dict__["telemetry"] = telemetry
+
+    def __getattr__(self, name):
+        return getattr(self._instrument, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self._instrument, name, value)
+
+    def _timed(self, verb, message, fn, *args, **kwargs):
+        telemetry = self.telemetry
+        start = telemetry.clock()
+        try:
+            result = fn(message, *args, **kwargs)
+        except Exception as e:
+            kind = "timeouts" if isinstance(e, TimeoutError) or "TMO" in str(e) else "io_errors"
+            telemetry.count(kind)
+            telemetry.event(kind, f"{verb} {command_type(message)}: {e}")
+            raise
+        telemetry.record(f"{verb} {command_type(message)}", telemetry.clock() - start)
+        return result
+
+    def write(self, message):
+        return self._timed("write", message, self._instrument.write)
+
+    def write_raw(self, message):
+        return self._timed("write", message, self._instrument.write_raw)
+
+    def query(self, message, *args, **kwargs):
+        return self._timed("query", message, self._instrument.query, *args, **kwargs)
+
+    def query_binary_values(self, message, *args, **kwargs):
+        return self._timed("query", message, self._instrument.query_binary_values, *args, **kwargs)
+
+
+class SnapshotExporter:
+    """Write the snapshots of some Telemetry objects to a JSON file periodically.
+
+    The file is replaced atomically, so a reader never sees half a snapshot.
+    Runs on a daemon thread; `stop()` writes a final snapshot.
+    """
+
+    def __init__(self, path, sources, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.sources = sources       # callable returning the Telemetry objects to export
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        data = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "instruments": [telemetry.snapshot() for telemetry in self.sources()]}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass   # telemetry must never take the app down
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+            self.write()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from compiler import (LIST_MAX_POINTS, MIN_HOLD_POINTS, compact_setpoints, compile_instrument_program, encode_setpoints,
+                      merge_short_segments, quantize)
+
+
+def test_compact_setpoints_run_length_encodes():
+    segments = compact_setpoints([0.0, 0.0, 0.5, 0.5, 0.5, 0.0], 0.01, 0.001)
+    assert segments.levels.tolist() == [0.0, 0.5, 0.0]
+    assert segments.counts.tolist() == [2, 3, 1]
+    assert segments.sample_count == 6
+    assert np.allclose(segments.holds, [0.02, 0.03, 0.01])
+
+def test_encode_setpoints_shares_equal_levels():
+    encoded = encode_setpoints(compact_setpoints([-0.0, 1.0, 0.0, 1.0], 0.01, 0.001))
+    commands = encoded.commands()
+    assert commands == [b"SOUR:VOLT 0.0000\n", b"SOUR:VOLT 1.0000\n"] * 2
+    assert commands[0] is commands[2]
+
+def expand(program):
+    """The setpoints a program plays, point by point."""
+    out = []
+    for seg in program.segments:
+        if seg.kind == "list":
+            out.extend(seg.values)
+        elif seg.kind == "sweep":
+            out.extend(np.linspace(seg.start, seg.stop, seg.points))
+        else:
+            out.extend([seg.level] * seg.points)
+    return np.array(out)
+
+def test_program_plays_the_quantized_waveform():
+    t = np.linspace(0, 1, 300, endpoint=False)
+    v = np.concatenate((np.linspace(-1, 1, 100), np.full(100, 0.5), np.sin(2 * np.pi * 3 * t[:100])))
+    program = compile_instrument_program(v, 0.01, 0.001)
+    assert program.count("sweep") >= 1
+    assert program.count("hold") >= 1
+    assert program.point_count == v.size
+    assert np.allclose(expand(program), quantize(v, 0.001), atol=0.001)
+    assert all(seg.points <= LIST_MAX_POINTS for seg in program.segments if seg.kind == "list")
+
+def test_program_without_holds_triggers_every_point():
+    v = np.concatenate((np.zeros(LIST_MAX_POINTS), np.ones(LIST_MAX_POINTS)))
+    assert compile_instrument_program(v, 0.01, 0.001).count("hold") == 2
+    program = compile_instrument_program(v, 0.01, 0.001, holds=False)
+    assert program.count("hold") == 0
+    assert program.triggered_points == v.size
+
+def test_short_neighbouring_segments_play_as_one_list():
+    v = np.concatenate((np.linspace(-1, 1, 30), np.full(MIN_HOLD_POINTS, 1.0), np.linspace(1, -1, 30)))
+    program = compile_instrument_program(v, 0.01, 0.001)
+    assert [seg.kind for seg in program.segments] == ["list"]
+    assert np.allclose(expand(program), quantize(v, 0.001), atol=0.001)
+    unmerged = compile_instrument_program(np.concatenate((v, v)), 0.01, 0.001).segments
+    assert len(merge_short_segments(unmerged)) == len(unmerged)
+
+def test_unplayable_waveforms_are_rejected():
+    assert compile_instrument_program([], 0.01, 0.001) is None
+    assert compile_instrument_program([0.0, np.nan], 0.01, 0.001) is None
+    assert compile_instrument_program([0.0, 25.0], 0.01, 0.001) is None
+    assert compile_instrument_program([0.0, 1.0], 0.0, 0.001) is None
+
+def test_lone_list_is_armed_in_chunks():
+    program = compile_instrument_program(np.sin(np.linspace(0, 6, 100)), 0.01, 0.001, sweeps=False)
+    assert len(program.segments) == 1
+    assert program.arm_counts(30) == [25, 5]
@@ -0,0 +1,163 @@
+"""run_waveform against simulated SourceMeters, on the real clock.
+
+Durations are checked against the planned ones, so a path that falls far
+behind its schedule (or re-uploads more than planned) fails here.
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from compiler import LIST_MAX_POINTS
+from execution import RunControl, configure_voltage_source, plan_samples, run_waveform
+from shadow import ShadowedInstrument
+from simulator import SimulatedSourceMeter
+from waveform import WaveformParams
+
+
+SERIAL = "ASRL4::INSTR"
+GPIB = "GPIB0::24::INSTR"
+MAX_ERROR = 0.002
+
+
+def open_instrument(resource):
+    sim = SimulatedSourceMeter(resource)
+    instrument = ShadowedInstrument(sim)
+    configure_voltage_source(instrument)
+    instrument.write("OUTP ON")
+    return sim, instrument
+
+
+def timed_run(instrument, samples, repeat_count, **kwargs):
+    start = time.perf_counter()
+    result = run_waveform(instrument, samples.v, samples.interval, repeat_count, 0.001, RunControl(), **kwargs)
+    return result, time.perf_counter() - start
+
+
+def assert_on_schedule(elapsed, expected):
+    # Generous for loaded CI machines, far below the slowdowns this guards against
+    assert elapsed == pytest.approx(expected, rel=0.25, abs=0.15)
+
+@pytest.mark.parametrize("resource", [SERIAL, GPIB])
+def test_stream_duration_and_points(resource):
+    sim, instrument = open_instrument(resource)
+    params = WaveformParams(waveform="Sine", frequency=2.0, repeat_count=2)
+    samples = plan_samples(params, resource, False, MAX_ERROR)
+    run_start = time.perf_counter() - sim.origin
+
+    result, elapsed = timed_run(instrument, samples, 2, list_mode=False, arm_bus_trigger=True)
+
+    assert result.mode == "stream"
+    assert result.samples == 2 * samples.sample_count
+    assert 0 < result.writes <= result.samples
+    assert result.timing.sent == result.writes
+    assert_on_schedule(elapsed, samples.expected_duration(2))
+    times, _ = sim.timeline()
+    assert (times >= run_start).sum() >= result.writes - 1
+    assert sim.error_codes() == []
+    assert sim.overflows == 0
+
+def test_pipelined_stream_reports_bus_times():
+    _, instrument = open_instrument(SERIAL)
+    params = WaveformParams(waveform="Sine", frequency=2.0)
+    samples = plan_samples(params, SERIAL, False, MAX_ERROR)
+
+    result, _ = timed_run(instrument, samples, 1, list_mode=False, pipeline=True)
+
+    assert result.timing.sent == result.writes
+    assert np.all(np.diff(result.timing.sent_at) > 0)
+
+@pytest.mark.parametrize("resource", [SERIAL, GPIB])
+@pytest.mark.parametrize("repeat_count", [1, 2])
+def test_list_duration_and_points(resource, repeat_count):
+    sim, instrument = open_instrument(resource)
+    params = WaveformParams(waveform="Sine", frequency=1.0, repeat_count=repeat_count)
+    samples = plan_samples(params, resource, True, MAX_ERROR)
+
+    result, elapsed = timed_run(instrument, samples, repeat_count, list_mode=True, sweeps=False)
+
+    assert samples.sample_count <= LIST_MAX_POINTS
+    assert result.mode == "list"
+    assert result.samples == repeat_count * samples.sample_count
+    assert result.writes == 1   # one list, repeated by the trigger model
+    assert_on_schedule(elapsed, samples.expected_duration(repeat_count))
+    assert sim.error_codes() == []
+
+@pytest.mark.parametrize("sweeps", [False, True])
+def test_list_capture_measures_every_point(sweeps):
+    _, instrument = open_instrument(GPIB)
+    params = WaveformParams(waveform="Square", amplitude=1.0, frequency=5.0)
+    samples = plan_samples(params, GPIB, True, MAX_ERROR)
+
+    result, _ = timed_run(instrument, samples, 1, list_mode=True, sweeps=sweeps, capture=True)
+
+    assert result.measurement is not None
+    assert len(result.measurement) == result.samples == samples.sample_count
+    assert not result.notes
+
+def test_stopped_list_run_reports_what_ran():
+    _, instrument = open_instrument(GPIB)
+    params = WaveformParams(waveform="Sine", frequency=1.0, repeat_count=5)
+    samples = plan_samples(params, GPIB, True, MAX_ERROR)
+    control = RunControl()
+    threading.Timer(0.5, control.stop).start()
+
+    start = time.perf_counter()
+    result = run_waveform(instrument, samples.v, samples.interval, 5, 0.001, control, list_mode=True)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < samples.expected_duration(5) / 2
+    assert 0 < result.samples < 5 * samples.sample_count
+
+def test_stopped_stream_reports_what_ran():
+    _, instrument = open_instrument(GPIB)
+    params = WaveformParams(waveform="Sine", frequency=1.0, repeat_count=5)
+    samples = plan_samples(params, GPIB, False, MAX_ERROR)
+    control = RunControl()
+    threading.Timer(0.5, control.stop).start()
+
+    result = run_waveform(instrument, samples.v, samples.interval, 5, 0.001, control, list_mode=False)
+
+    assert 0 < result.samples < 5 * samples.sample_count
+    assert result.writes <= result.samples
+
+
+def test_segmented_list_run_reports_start_lag():
+    _, instrument = open_instrument(SERIAL)
+    v = np.sin(np.linspace(0, 6, 3 * LIST_MAX_POINTS))
+
+    result = run_waveform(instrument, v, 0.01, 1, 0.001, RunControl(), list_mode=True, sweeps=False)
+
+    assert len(result.start_lag) == 3
+    assert result.start_lag[0] == 0
+    assert np.all(np.diff(result.start_lag) > 0)   # the host round trips add up
+    assert "3 segment starts" in result.summary()
+
+
+def test_list_run_after_a_streamed_run():
+    sim, instrument = open_instrument(SERIAL)
+    params = WaveformParams(waveform="Sine", frequency=2.0)
+    samples = plan_samples(params, SERIAL, False, MAX_ERROR)
+    timed_run(instrument, samples, 1, list_mode=False, arm_bus_trigger=True)
+
+    configure_voltage_source(instrument)   # shadow is synced: no *RST
+    samples = plan_samples(params, SERIAL, True, MAX_ERROR)
+    result, elapsed = timed_run(instrument, samples, 1, list_mode=True, sweeps=False)
+
+    assert result.samples == samples.sample_count
+    assert_on_schedule(elapsed, samples.expected_duration(1))
+    assert sim.error_codes() == []
+
+
+def test_configure_disarms_a_waiting_trigger_model():
+    sim, instrument = open_instrument(GPIB)
+    instrument.write("TRIG:SOUR BUS;TRIG:COUN 1;INIT")   # e.g. left by an interrupted streamed run
+    configure_voltage_source(instrument)
+    samples = plan_samples(WaveformParams(waveform="Sine", frequency=5.0), GPIB, True, MAX_ERROR)
+
+    result, elapsed = timed_run(instrument, samples, 1, list_mode=True, sweeps=False)
+
+    assert_on_schedule(elapsed, samples.expected_duration(1))
+    assert sim.error_codes() == []
@@ -0,0 +1,32 @@
+import pytest
+
+from jobs import parse_job
+
+
+def job(**settings):
+    return parse_job(dict(id="j", instrument="A", **settings))
+
+
+def test_settings_keep_their_json_types():
+    parsed = job(amplitude=2, repeat_count=3, sweeps=False, duty=25, policy="skip")
+    assert parsed.params.amplitude == 2.0 and isinstance(parsed.params.amplitude, float)
+    assert parsed.params.repeat_count == 3
+    assert parsed.params.duty == 0.25
+    assert parsed.options["sweeps"] is False
+    assert parsed.options["policy"] == "skip"
+
+@pytest.mark.parametrize("settings", [
+    {"sweeps": "false"}, {"start_high": 0}, {"amplitude": "2"}, {"amplitude": True},
+    {"repeat_count": 2.5}, {"waveform": 3}, {"duty": "50"}, {"action": "steady", "voltage": "1"},
+])
+def test_mismatched_types_are_rejected(settings):
+    with pytest.raises(ValueError):
+        job(**settings)
+
+
+def test_empty_custom_table_is_rejected():
+    with pytest.raises(ValueError, match="custom"):
+        job(waveform="Custom")
+    with pytest.raises(ValueError, match="custom"):
+        job(waveform="Custom", custom=[])
+    assert job(waveform="Custom", custom=[[0, 0.0], [0.5, 1.0]]).params.custom_voltages.tolist() == [0.0, 1.0]
@@ -0,0 +1,100 @@
+"""The instrument panel, offscreen, on a simulated SourceMeter."""
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+import main2
+from connections import ConnectionManager
+from main2 import KeithleyPanel, StationApp
+from station import InstrumentSpec, Station, Step
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def process_events(app, seconds=0.1):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        app.processEvents()
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    messages = []
+    for kind in ("warning", "critical", "information"):
+        monkeypatch.setattr(QtWidgets.QMessageBox, kind, lambda *args, kind=kind: messages.append((kind, args[1])))
+    return messages
+
+
+@pytest.fixture
+def panel(app, messages):
+    connections = ConnectionManager(simulate=True)
+    panel = KeithleyPanel("ASRL4::INSTR", "Test", "test", connections)
+    while panel.connecting:
+        process_events(app, 0.01)
+    assert not panel.simulation_mode
+    panel.messages = messages
+    yield panel
+    panel.shutdown()
+    connections.close_all()
+
+
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_empty_custom_table_is_rejected(app, panel, adaptive):
+    panel.waveform_combo.setCurrentText("Custom")
+    panel.adaptive_checkbox.setChecked(adaptive)
+    panel.live_checkbox.setChecked(True)
+
+    assert panel.send_waveform_to_keithley() is False
+    assert panel.apply_pulse_waveform() is False
+    assert [kind for kind, _ in panel.messages] == ["warning", "warning"]
+
+    finished = []
+    panel.step_finished.connect(lambda step_id, ok: finished.append((step_id, ok)))
+    panel.run_step(Step("s", "test", "waveform"))
+    process_events(app)
+    assert finished == [("s", False)]
+    assert panel.current_step is None
+
+
+def test_parallel_run_fails_fast_when_a_panel_does_not_start(app, messages, monkeypatch, tmp_path):
+    connections = ConnectionManager(simulate=True)
+    monkeypatch.setattr(main2, "shared_manager", lambda: connections)
+    monkeypatch.setattr(main2, "TELEMETRY_DIR", str(tmp_path))
+    station = Station([InstrumentSpec("a", "ASRL4::INSTR"), InstrumentSpec("b", "GPIB0::24::INSTR")])
+    window = StationApp(station)
+    while any(panel.connecting for panel in window.panels.values()):
+        process_events(app, 0.01)
+    window.panels["b"].waveform_combo.setCurrentText("Custom")   # empty table: never starts
+
+    start = time.perf_counter()
+    window.run_parallel()
+    while window.status_label.text() == "Skew: running..." and time.perf_counter() - start < 10:
+        process_events(app, 0.05)
+
+    assert window.status_label.text() == "Skew: run did not start"
+    assert time.perf_counter() - start < 5   # not the sync timeout
+    window.close()
+
+
+def test_steady_step_voltage_leaves_the_field_alone(app, panel):
+    panel.steady_voltage_input.setText("0.25")
+    finished = []
+    panel.step_finished.connect(lambda step_id, ok: finished.append((step_id, ok)))
+
+    panel.run_step(Step("s", "test", "steady", voltage=1.5))
+    for _ in range(100):
+        if finished:
+            break
+        process_events(app, 0.02)
+
+    assert finished == [("s", True)]
+    assert panel._steady_v == 1.5
+    assert panel.steady_voltage_input.text() == "0.25"
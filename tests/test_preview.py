@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from preview import PeriodicLOD, SampledLOD
+
+
+def brute_force_envelope(v, starts, stops):
+    return (np.array([v[a:b].min() for a, b in zip(starts, stops)]),
+            np.array([v[a:b].max() for a, b in zip(starts, stops)]))
+
+@pytest.mark.parametrize("repeat_count", [1, 7, 1000])
+def test_periodic_lod_matches_materialized_repeats(repeat_count):
+    rng = np.random.default_rng(1)
+    cycle = rng.normal(size=257)
+    lod = PeriodicLOD(cycle, 1.0, repeat_count)
+    full = np.append(np.tile(cycle, repeat_count), cycle[0])
+
+    t, v = lod.view(*lod.span, 100)
+    lo, hi = v[0::2], v[1::2]
+    edges = np.linspace(0, full.size, 101).astype(np.intp)
+    if full.size <= 200:
+        assert np.array_equal(v, full)
+    else:
+        want_lo, want_hi = brute_force_envelope(full, edges[:-1], edges[1:])
+        assert np.allclose(lo, want_lo)
+        assert np.allclose(hi, want_hi)
+        assert np.allclose(t[0::2], edges[:-1] * lod.dt)
+
+
+def test_periodic_lod_zoomed_in_returns_raw_samples():
+    cycle = np.arange(10.0)
+    lod = PeriodicLOD(cycle, 1.0, 50)
+    t, v = lod.view(2.0, 2.5, 100)
+    assert np.array_equal(v, cycle[np.round(t / lod.dt).astype(int) % 10])
+
+def test_sampled_lod_envelope():
+    rng = np.random.default_rng(2)
+    t = np.sort(rng.uniform(0, 10, 5000))
+    v = rng.normal(size=t.size)
+    t_out, v_out = SampledLOD(t, v).view(0.0, 10.0, 50)
+    assert v_out.size <= 2 * 51
+    assert v_out.min() == v.min()
+    assert v_out.max() == v.max()
+    assert np.all(np.diff(t_out) >= 0)
@@ -0,0 +1,55 @@
+import numpy as np
+
+from capture import Measurement
+from live import LiveBuffer
+from runlog import HELD, PLAYED, RunLog, RunLogger, STREAMED, tee_log
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "run.k2log")
+    with RunLogger(path, interval=0.01, grow_records=4) as log:
+        log.start(origin=10.0)
+        log.append(0.5, 10.002)
+        log.skip(2)
+        log.append(1.0, 10.031, samples=5, kind=HELD)
+        log.extend([0.1, 0.2, 0.3], 10.08 + np.arange(3) * 0.01)
+        log.fill_readings(2, Measurement(np.array([0.11, 0.21]), np.zeros(2), np.zeros(2)))
+
+    run = RunLog(path)
+    assert len(run) == 5
+    assert run.interval == 0.01
+    assert run.sample.tolist() == [0, 3, 8, 9, 10]
+    assert run.kind.tolist() == [STREAMED, HELD, PLAYED, PLAYED, PLAYED]
+    assert run.setpoint.tolist() == [0.5, 1.0, 0.1, 0.2, 0.3]
+    assert np.allclose(run.sent_at, [0.002, 0.031, 0.08, 0.09, 0.10])
+    assert np.allclose(run.voltage[2:4], [0.11, 0.21])
+    assert np.isnan(run.voltage[4])
+    assert np.allclose(run.send_errors(), [0.002])
+
+def test_set_sent_at_corrects_logged_times(tmp_path):
+    path = str(tmp_path / "run.k2log")
+    with RunLogger(path, interval=0.01) as log:
+        log.start(origin=10.0)
+        for k in range(3):
+            log.append(float(k), 10.0 + 0.01 * k)
+        log.set_sent_at(1, [10.013, 10.024])
+    assert np.allclose(RunLog(path).sent_at, [0.0, 0.013, 0.024])
+
+def test_live_buffer_keeps_the_latest_points():
+    live = LiveBuffer(capacity=8)
+    live.start(origin=0.0)
+    for k in range(20):
+        live.append(float(k), k * 0.1)
+    t, setpoint, _ = live.window(seconds=0.4, now=1.95)
+    # The level before the window is kept, so the trace starts at its edge
+    assert setpoint.tolist() == [15.0, 16.0, 17.0, 18.0, 19.0]
+    assert np.allclose(t, [-0.45, -0.35, -0.25, -0.15, -0.05])
+
+def test_tee_log_feeds_every_logger(tmp_path):
+    live = LiveBuffer(capacity=8)
+    assert tee_log(None, live) is live
+    with RunLogger(str(tmp_path / "run.k2log")) as log:
+        both = tee_log(log, live)
+        both.start(origin=0.0)
+        both.extend([1.0, 2.0], [0.1, 0.2])
+        assert len(log) == len(live) == 2
@@ -0,0 +1,61 @@
+import pytest
+
+from scheduler import DeadlineScheduler, SKIP, STRETCH
+
+
+class ManualClock:
+    """A clock the test moves by hand; it never has to wait on one."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_on_time_sends_have_no_error():
+    scheduler = DeadlineScheduler(0.01, spin_threshold=0.0)
+    for _ in range(5):
+        assert scheduler.wait_slot()
+        scheduler.mark_sent(scheduler.deadline())
+    report = scheduler.finish(wait=False)
+    assert report.sent == 5
+    assert report.max_error == 0.0
+
+def test_stretch_shifts_later_deadlines():
+    clock = ManualClock()
+    scheduler = DeadlineScheduler(0.01, STRETCH, clock=clock)
+    clock.now += 0.05                 # sample 0 is 50 ms late
+    assert scheduler.wait_slot()
+    scheduler.mark_sent()
+    assert scheduler.deadline() == pytest.approx(clock.now + 0.01)
+    report = scheduler.finish(wait=False)
+    assert report.late == 1
+    assert report.errors[0] == pytest.approx(0.05)
+
+def test_skip_drops_samples_whose_slot_is_over():
+    clock = ManualClock()
+    scheduler = DeadlineScheduler(0.01, SKIP, clock=clock)
+    clock.now += 0.025                # slots 0 and 1 are over, slot 2 has started
+    assert not scheduler.wait_slot()
+    assert not scheduler.wait_slot()
+    assert scheduler.wait_slot()
+    scheduler.mark_sent()
+    report = scheduler.finish(wait=False)
+    assert (report.skipped, report.late) == (2, 1)
+    assert scheduler.deadline() == pytest.approx(100.03)
+
+def test_retime_moves_errors_with_send_times():
+    clock = ManualClock()
+    scheduler = DeadlineScheduler(0.01, clock=clock)
+    for k in range(3):
+        clock.now = 100.0 + 0.01 * k
+        scheduler.wait_slot()
+        scheduler.mark_sent()
+    report = scheduler.finish(wait=False)
+    report.retime([100.002, 100.013, 100.024])
+    assert report.errors.tolist() == pytest.approx([0.002, 0.003, 0.004])
+    assert report.sent_at.tolist() == [100.002, 100.013, 100.024]
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        DeadlineScheduler(0.01, "late")
@@ -0,0 +1,63 @@
+import pytest
+
+from station import DONE, FAILED, InstrumentSpec, PENDING, SKIPPED, Station, Step, StepPlan, StepScheduler
+
+
+def make_station():
+    instruments = [InstrumentSpec("A", "GPIB0::24::INSTR"), InstrumentSpec("B", "GPIB0::25::INSTR"),
+                   InstrumentSpec("C", "ASRL4::INSTR")]
+    steps = [Step("a", "A", "waveform"), Step("b", "B", "waveform"), Step("c", "C", "waveform"),
+             Step("d", "C", "steady", after=["a", "b"], voltage=1.0)]
+    return Station(instruments, steps)
+
+
+def ids(steps):
+    return [step.id for step in steps]
+
+def test_shared_bus_is_serialized():
+    station = make_station()
+    scheduler = StepScheduler(station.plan, station.bus_of_step)
+    assert ids(scheduler.dispatch()) == ["a", "c"]    # b waits for the GPIB board
+    assert scheduler.dispatch() == []
+    scheduler.complete("a", True)
+    assert ids(scheduler.dispatch()) == ["b"]
+    scheduler.complete("b", True)
+    assert scheduler.dispatch() == []                  # d waits for C's bus
+    scheduler.complete("c", True)
+    assert ids(scheduler.dispatch()) == ["d"]
+    scheduler.complete("d", True)
+    assert scheduler.finished and scheduler.ok
+
+
+def test_failure_skips_dependents_only():
+    station = make_station()
+    scheduler = StepScheduler(station.plan, lambda step: step.instrument)
+    assert ids(scheduler.dispatch()) == ["a", "b", "c"]
+    scheduler.complete("a", False)
+    assert scheduler.state["d"] == SKIPPED
+    assert scheduler.state["b"] != PENDING
+    scheduler.complete("b", True)
+    scheduler.complete("c", True)
+    assert scheduler.dispatch() == []
+    assert scheduler.finished and not scheduler.ok
+    assert scheduler.state == {"a": FAILED, "b": DONE, "c": DONE, "d": SKIPPED}
+
+
+def test_invalid_plans_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        StepPlan([Step("a", "A", "waveform", after=["b"]), Step("b", "A", "waveform", after=["a"])])
+    with pytest.raises(ValueError, match="unknown dependency"):
+        StepPlan([Step("a", "A", "waveform", after=["x"])])
+    with pytest.raises(ValueError, match="Duplicate"):
+        StepPlan([Step("a", "A", "waveform"), Step("a", "A", "waveform")])
+
+
+def test_chain_runs_in_order():
+    plan = StepPlan.chain(["A", "B", "C"])
+    scheduler = StepScheduler(plan, lambda step: step.instrument)
+    order = []
+    while not scheduler.finished:
+        for step in scheduler.dispatch():
+            order.append(step.instrument)
+            scheduler.complete(step.id, True)
+    assert order == ["A", "B", "C"]
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from waveform import WaveformParams, adaptive_samples, synthesize
+
+
+def test_synthesize_matches_the_scalar_definitions():
+    t = np.linspace(0, 2, 401)
+    sine = synthesize(WaveformParams(waveform="Sine", amplitude=2.0, frequency=1.5, phase=30.0, offset=0.1), t)
+    assert np.allclose(sine, 2.0 * np.sin(2 * np.pi * 1.5 * t + np.deg2rad(30.0)) + 0.1)
+    square = synthesize(WaveformParams(waveform="Square", duty=0.25), t[:-1])
+    assert set(square.tolist()) == {-1.0, 1.0}
+    assert np.mean(square > 0) == 0.25
+
+@pytest.mark.parametrize("kind", ["Sine", "Cosine", "Square", "Sawtooth"])
+def test_int_amplitude_synthesizes_floats(kind):
+    v = synthesize(WaveformParams(waveform=kind, amplitude=2, offset=0.5), np.linspace(0, 1, 9))
+    assert v.dtype == float
+    assert v.min() >= -1.5 and v.max() <= 2.5
+
+def test_adaptive_samples_stay_within_max_error():
+    params = WaveformParams(waveform="Sine", frequency=3.0)
+    samples = adaptive_samples(params, max_rate=1000.0, max_error=0.002)
+    t = np.arange(samples.sample_count) * samples.interval
+    assert np.abs(samples.v - synthesize(params, t)).max() <= 0.002 + 1e-9
+    assert samples.interval >= 1 / 1000.0
+
+
+def test_expected_duration_counts_the_upload_once():
+    params = WaveformParams(waveform="Sawtooth", frequency=2.0)
+    samples = adaptive_samples(params, max_rate=100.0, max_error=0.002)
+    samples.upload_time = 0.3
+    assert samples.sample_count == 50
+    assert samples.expected_duration(4) == pytest.approx(4 * 0.5 + 0.3)
+    assert samples.summary(4) == "50 samples @ 10.00 ms, upload 0.30 s, expected 2.30 s"
@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+WAVEFORM_TYPES = ("Sine", "Cosine", "Square", "Sawtooth", "Custom")
+
+EXECUTION_STEP = 0.01            # s between execution samples
+PREVIEW_POINTS_PER_CYCLE = 1000
+MAX_ADAPTIVE_SAMPLES = 100_000   # per cycle
+
+
+@dataclass
+class WaveformParams:
+    """Everything needed to synthesize a waveform, independent of any widget."""
+
+    waveform: str = "Sine"
+    amplitude: float = 1.0       # V
+    frequency: float = 1.0       # Hz
+    phase: float = 0.0           # deg
+    offset: float = 0.0          # V
+    duty: float = 0.5            # fraction of the period spent high (Square)
+    start_high: bool = True      # Square starts on the high level
+    custom_times: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    custom_voltages: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    resolution: float = 0.001    # V
+    repeat_count: int = 1
+    steady_voltage: float = 0.0  # V
+
+    @property
+    def period(self):
+        return 1.0 / self.frequency
+
+    @property
+    def total_duration(self):
+        return self.period * self.repeat_count
+
+
+def synthesize(params, t):
+    """Voltages of a periodic waveform at times `t` (offset included).
+
+    Custom waveforms are defined by their table, not by a function of time;
+    use `execution_samples` for those.
+    """
+    t = np.asarray(t, dtype=float)
+    amp = float(params.amplitude)   # an int amplitude would make Square an int array
+    freq = params.frequency
+    kind = params.waveform
+
+    if kind in ("Sine", "Cosine"):
+        v = t * (2 * np.pi * freq)
+        v += np.deg2rad(params.phase)
+        (np.sin if kind == "Sine" else np.cos)(v, out=v)
+        v *= amp
+    elif kind == "Square":
+        # Position within the cycle as a fraction of the period
+        cycle_pos = t * freq
+        if not params.start_high:
+            cycle_pos += params.duty
+        cycle_pos -= np.floor(cycle_pos)
+        v = np.where(cycle_pos < params.duty, amp, -amp)
+    elif kind == "Sawtooth":
+        x = t * freq
+        v = x - np.floor(x + 0.5)
+        v *= 2 * amp
+    else:
+        raise ValueError(f"Not a periodic waveform: {kind}")
+
+    v += params.offset
+    return v
+
+
+def _custom_samples(params):
+    t = np.asarray(params.custom_times, dtype=float)
+    v = np.asarray(params.custom_voltages, dtype=float) + params.offset
+    return t, v
+
+
+def execution_samples(params, step=EXECUTION_STEP):
+    """One cycle sampled every `step` seconds, as sent to the instrument."""
+    if params.waveform == "Custom":
+        return _custom_samples(params)
+    t = np.arange(0, params.period, step)
+    return t, synthesize(params, t)
+
+
+def preview_cycle(params, points_per_cycle=PREVIEW_POINTS_PER_CYCLE):
+    """One period at preview density, endpoint excluded so it tiles exactly."""
+    t = np.linspace(0, params.period, points_per_cycle, endpoint=False)
+    return t, synthesize(params, t)
+
+
+def rdp_indices(t, v, tolerance):
+    """Vertices kept by Ramer-Douglas-Peucker with a vertical (voltage) error bound.
+
+    Linear interpolation through v[indices] stays within `tolerance` of
+    every input sample.
+    """
+    n = len(v)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        line = v[a] + (v[b] - v[a]) * (t[a + 1:b] - t[a]) / (t[b] - t[a])
+        deviation = np.abs(v[a + 1:b] - line)
+        k = int(np.argmax(deviation))
+        if deviation[k] > tolerance:
+            split = a + 1 + k
+            keep[split] = True
+            stack.append((a, split))
+            stack.append((split, b))
+    return np.flatnonzero(keep)
+
+
+class AdaptiveSamples:
+    """One cycle on a uniform grid, reconstructed from RDP vertices.
+
+    Every grid sample is played: the vertices only make the pieces between
+    them exactly linear (so they compile into sweeps) or flat (so they are
+    held instead of rewritten). `upload_time` is the time to load the cycle
+    into the instrument before it plays (list mode).
+    """
+
+    def __init__(self, t, v, vertices, interval, upload_time=0.0):
+        self.t = t
+        self.v = v
+        self.vertices = vertices
+        self.interval = interval
+        self.upload_time = upload_time
+
+    @property
+    def sample_count(self):
+        return len(self.v)
+
+    def expected_duration(self, repeat_count=1):
+        return self.sample_count * self.interval * repeat_count + self.upload_time
+
+    def summary(self, repeat_count=1):
+        text = f"{self.sample_count} samples @ {self.interval * 1e3:.2f} ms"
+        if self.upload_time:
+            text += f", upload {self.upload_time:.2f} s"
+        return text + f", expected {self.expected_duration(repeat_count):.2f} s"
+
+
+def adaptive_samples(params, max_rate, max_error, max_samples=MAX_ADAPTIVE_SAMPLES):
+    """Sample one cycle as densely as `max_rate` (setpoints/s) allows, then simplify.
+
+    The grid step follows the achievable command rate instead of a fixed
+    10 ms. RDP keeps the vertices needed to stay within `max_error` volts,
+    and the returned samples are the piecewise-linear reconstruction on the
+    grid, so straight pieces compile into native sweeps. Custom tables are
+    interpolated over their own time column. A cycle has at most
+    `max_samples` samples; beyond that the grid gets coarser.
+    """
+    if params.waveform == "Custom":
+        table_t, table_v = _custom_samples(params)
+        if table_t.size < 2:
+            return AdaptiveSamples(table_t, table_v, np.arange(table_t.size), EXECUTION_STEP)
+        span = float(table_t[-1] - table_t[0])
+    else:
+        span = params.period
+    # A custom table's grid includes its end point
+    limit = max_samples - 1 if params.waveform == "Custom" else max_samples
+    n = int(min(max(span * max_rate, 2), limit))
+    # Too fast for the transport: keep 2 samples and let the cycle stretch
+    interval = max(span / n, 1.0 / max_rate)
+
+    if params.waveform == "Custom":
+        t = table_t[0] + np.arange(n + 1) * (span / n)
+        ideal = np.interp(t, table_t, table_v)
+    else:
+        t = np.arange(n) * (span / n)
+        ideal = synthesize(params, t)
+
+    vertices = rdp_indices(t, ideal, max_error)
+    v = np.interp(t, t[vertices], ideal[vertices])
+    return AdaptiveSamples(t, v, vertices, interval)
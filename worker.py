@@ -0,0 +1,83 @@
+import queue
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from execution import RunControl
+from telemetry import telemetry_of
+
+
+class InstrumentWorker(QThread):
+    """Owns one instrument session and runs queued jobs off the GUI thread.
+
+    Jobs are callables `fn(instrument, control)`; only this thread talks to
+    the instrument once the worker is started. Results and errors come back
+    to the GUI through queued signals.
+    """
+
+    job_started = pyqtSignal(str)
+    job_finished = pyqtSignal(str, bool)      # name, ok
+    job_failed = pyqtSignal(str, str)         # error title, message
+    job_result = pyqtSignal(str, object)      # name, whatever the job returned
+    progress = pyqtSignal(int, int)           # done, total samples
+
+    def __init__(self, instrument, parent=None):
+        super().__init__(parent)
+        self.instrument = instrument
+        self.control = RunControl(on_progress=self.progress.emit)
+        self._jobs = queue.Queue()
+
+    def submit(self, name, fn, error_title="Error"):
+        self._jobs.put((name, fn, error_title))
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def stop(self):
+        """Abort the running job and drop anything still queued."""
+        self._drain()
+        self.control.stop()
+
+    def shutdown(self, timeout_ms=5000):
+        self.stop()
+        self._jobs.put(None)
+        self.wait(timeout_ms)
+
+    def _drain(self):
+        try:
+            while True:
+                if self._jobs.get_nowait() is None:
+                    self._jobs.put(None)  # keep a pending shutdown
+                    return
+        except queue.Empty:
+            pass
+
+    def run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            name, fn, error_title = job
+            self.control.reset()
+            self.job_started.emit(name)
+            telemetry = telemetry_of(self.instrument)
+            if telemetry is not None:
+                telemetry.event("job started", name)
+                started = telemetry.clock()
+            try:
+                result = fn(self.instrument, self.control)
+            except Exception as e:
+                if telemetry is not None:
+                    telemetry.count("failed_jobs")
+                    telemetry.event("job failed", f"{name}: {e}")
+                self.job_failed.emit(error_title, str(e))
+                self.job_finished.emit(name, False)
+            else:
+                if telemetry is not None:
+                    telemetry.record(f"job {name}", telemetry.clock() - started)
+                    telemetry.event("job finished", name)
+                if result is not None:
+                    self.job_result.emit(name, result)
+                self.job_finished.emit(name, True)